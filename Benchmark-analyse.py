@@ -0,0 +1,80 @@
+import argparse
+import logging
+import os
+import random
+import time
+from script_loader import load_script
+
+
+def accumulated_policy(benchmark_simulate, rule_count, seed=3):
+    """
+    The synthetic policy of Benchmark-simulate.py with the clutter real policies
+    gather: about a fifth of the rules repeat part of an earlier rule's condition
+    (some with the other action), some are split into consecutive halves that
+    could be one rule, and a few name lists that do not exist.
+    """
+    rng = random.Random(seed)
+    policy = benchmark_simulate.synthetic_policy(rule_count)
+    rules = policy[0]
+    for index in range(1, rule_count):
+        roll = rng.random()
+        condition = rules[index]['condition']
+        if roll < 0.2:
+            earlier = rules[rng.randrange(index)]['condition']
+            condition.update({field: names[:max(len(names) - rng.randrange(2), 1)] if names else names for field, names in earlier.items()})
+        elif roll < 0.3:
+            condition.update(rules[index - 1]['condition'], destinationAddress=condition['destinationAddress'])
+            rules[index]['action'] = rules[index - 1]['action']
+        elif roll < 0.31:
+            condition['service'] = ['missing-service-list']
+    return policy
+
+
+def benchmark_analyse(analyse, simulate, benchmark_simulate, sizes, flow_count, logger):
+    """
+    Time the analysis and check on synthetic flows that the reduced rule list
+    takes the same action on every flow as the original.
+    """
+    print(f"{'rules':>8} {'analysis':>10} {'reduced':>8} {'unmatchable':>12} {'shadowed':>9} {'redundant':>10} {'merged':>7}  same actions")
+    for rule_count in sizes:
+        policy = accumulated_policy(benchmark_simulate, rule_count)
+
+        start = time.perf_counter()
+        rule_sets = analyse.RuleSets(*policy, logger)
+        findings, reduced = analyse.analyse_rules(policy[0], rule_sets, simulate, logger)
+        seconds = time.perf_counter() - start
+
+        flows = benchmark_simulate.synthetic_flows(policy[1], flow_count)
+        original = simulate.PolicySimulator(*policy, logger)
+        optimised = simulate.PolicySimulator(reduced, *policy[1:], logger)
+
+        def action(simulator, flow):
+            index = simulator.match(*flow)
+            return simulator.rules[index]['action'] if index is not None else simulate.DEFAULT_ACTION
+
+        same = all(action(original, flow) == action(optimised, flow) for flow in flows)
+        counts = {kind: sum(1 for finding in findings if finding['finding'] == kind) for kind in analyse.FINDINGS}
+        print(f"{rule_count:>8} {seconds:>9.2f}s {len(reduced):>8} {counts['unmatchable']:>12} {counts['shadowed']:>9} {counts['redundant']:>10} {counts['merged']:>7}  {same}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark Firewall-analyse.py and check that its reduced rule lists keep every flow\'s action')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='Rule counts to benchmark (default: 1000 10000 50000)')
+    parser.add_argument('--flows', type=int, default=20000, help='Flows checked per rule count (default: 20000)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logger = logging.getLogger("benchmark_analyse")
+    logger.addHandler(logging.NullHandler())
+    analyse = load_script("Firewall-analyse.py")
+    simulate = load_script("Firewall-simulate.py")
+    benchmark_simulate = load_script("Benchmark-simulate.py")
+
+    print("Rule analysis (analyse_rules)")
+    benchmark_analyse(analyse, simulate, benchmark_simulate, args.sizes, args.flows, logger)
+
+
+if __name__ == "__main__":
+    main()
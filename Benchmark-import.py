@@ -0,0 +1,203 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+import pandas as pd
+from script_loader import load_script
+
+
+def replace_with_names_rowwise(df_security_rules, df_iplist):
+    """Reference copy of the original per-cell replace_with_names."""
+    df_security_rules.columns = df_security_rules.columns.str.strip()
+    address_to_name = dict(zip(df_iplist['addresses'], df_iplist['name']))
+
+    def replace_with_names_single(value):
+        if isinstance(value, str):
+            elements = value.split(',')
+            replaced_elements = []
+            for element in elements:
+                element = element.strip()
+                if element in address_to_name:
+                    replaced_elements.append(address_to_name[element])
+                elif element:
+                    replaced_elements.append(element)
+            return ', '.join(replaced_elements)
+        else:
+            return value
+
+    df_security_rules['Source Address Lists'] = df_security_rules['Source Address Lists'].apply(replace_with_names_single)
+    df_security_rules['Destination Address Lists'] = df_security_rules['Destination Address Lists'].apply(replace_with_names_single)
+    return df_security_rules
+
+def convert_to_json_iterrows(df_security_rule):
+    """Reference copy of the original iterrows-based convert_to_json."""
+    json_list = []
+    prev_rule_name = None
+    for index, row in df_security_rule.iterrows():
+        source_addresses = [address.strip() for address in str(row['Source Address Lists']).split(',') if address.strip()] if not pd.isna(row['Source Address Lists']) and row['Source Address Lists'] else []
+        destination_addresses = [address.strip() for address in str(row['Destination Address Lists']).split(',') if address.strip()] if not pd.isna(row['Destination Address Lists']) and row['Destination Address Lists'] else []
+        action = row['Action'] if not pd.isna(row['Action']) and row['Action'] else "ALLOW"
+        service_ports = [port.strip() for port in str(row['Service Lists']).split(',') if port.strip()] if not pd.isna(row['Service Lists']) and row['Service Lists'] else []
+        url_lists = [url.strip() for url in str(row['Url Lists']).split(',') if url.strip()] if not pd.isna(row['Url Lists']) and row['Url Lists'] else []
+        icmp_code = [code.strip() for code in str(row['Application Lists']).split(',') if code.strip()] if not pd.isna(row['Application Lists']) and row['Application Lists'] else []
+        json_obj = {
+            "name": row['name'],
+            "condition": {
+                "sourceAddress": source_addresses,
+                "destinationAddress": destination_addresses,
+                "service": service_ports,
+                "url": url_lists,
+                "application": icmp_code
+            },
+            "position": {"afterRule": prev_rule_name} if prev_rule_name else {},
+            "action": action
+        }
+        json_list.append(json_obj)
+        prev_rule_name = row['name']
+    return json_list
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the cyclic garbage collector while building large lists of dicts, so
+    the timings do not include repeated rescans of every rule built so far.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def convert_to_json_columnar(firewall_import, df_security_rule, logger, address_to_name):
+    """Collect every rule iter_security_rules yields for the sheet, processed as one chunk."""
+    with gc_paused():
+        return list(firewall_import.iter_security_rules(df_security_rule, logger, address_to_name, chunk_size=max(len(df_security_rule), 1)))
+
+
+def url_lists_filter_per_name(df):
+    """Reference copy of the original excel_to_json_url_lists loop."""
+    json_list = []
+    for name in df['name'].unique():
+        filtered_df = df[df['name'] == name]
+        urls = [{"pattern": pattern, "type": "SIMPLE"} for pattern in filtered_df['pattern']]
+        json_list.append({"data": {"name": name, "urls": urls}})
+    return json_list
+
+
+def synthetic_security_rules(rule_count, seed=1):
+    """
+    Build 'security-rules' and 'iplist' sheets with a mix of list names, literal
+    addresses that map to list names, blank cells and missing actions.
+    """
+    rng = random.Random(seed)
+    list_count = max(rule_count // 10, 10)
+    df_iplist = pd.DataFrame({
+        'name': [f"net-{i}" for i in range(list_count)],
+        'addresses': [f"10.{i // 256 % 256}.{i % 256}.0/24" for i in range(list_count)],
+    })
+
+    def cell(prefix, max_items, literal=False):
+        items = [f"{prefix}-{rng.randrange(list_count)}" for _ in range(rng.randrange(max_items + 1))]
+        if literal and rng.random() < 0.3:
+            i = rng.randrange(list_count)
+            items.append(f"10.{i // 256 % 256}.{i % 256}.0/24")
+        return ", ".join(items) if items else None
+
+    df_security_rules = pd.DataFrame({
+        'name': [f"rule-{i}" for i in range(rule_count)],
+        'Source Address Lists': [cell('net', 3, literal=True) for _ in range(rule_count)],
+        'Destination Address Lists': [cell('net', 3, literal=True) for _ in range(rule_count)],
+        'Service Lists': [cell('svc', 3) for _ in range(rule_count)],
+        'Application Lists': [cell('icmp', 1) for _ in range(rule_count)],
+        'Url Lists': [cell('urls', 2) for _ in range(rule_count)],
+        'Action': [rng.choice(['ALLOW', 'DROP', None]) for _ in range(rule_count)],
+    })
+    return df_security_rules, df_iplist
+
+
+def synthetic_url_lists(pattern_count, seed=1):
+    """
+    Build a 'url_lists' sheet with about 66 patterns per list, with the rows of each
+    list scattered through the sheet.
+    """
+    rng = random.Random(seed)
+    list_count = max(pattern_count // 66, 1)
+    return pd.DataFrame({
+        'name': [f"urls-{rng.randrange(list_count)}" for _ in range(pattern_count)],
+        'pattern': [f"*.site{i}.example.com" for i in range(pattern_count)],
+    })
+
+
+def benchmark_security_rules(firewall_import, sizes, logger):
+    """
+    Time the original row-wise security-rule conversion against the column-wise one
+    and check that both serialise to identical securityrules.json content.
+    """
+    print(f"{'rules':>8} {'iterrows':>10} {'columnar':>10} {'speedup':>8}  identical")
+    for rule_count in sizes:
+        df_security_rules, df_iplist = synthetic_security_rules(rule_count)
+
+        start = time.perf_counter()
+        reference = convert_to_json_iterrows(replace_with_names_rowwise(df_security_rules.copy(), df_iplist))
+        reference_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = convert_to_json_columnar(firewall_import, df_security_rules.copy(), logger, firewall_import.address_names(df_iplist))
+        result_seconds = time.perf_counter() - start
+
+        identical = json.dumps(reference, indent=4) == json.dumps(result, indent=4)
+        print(f"{rule_count:>8} {reference_seconds:>9.2f}s {result_seconds:>9.2f}s {reference_seconds / result_seconds:>7.1f}x  {identical}")
+
+
+def benchmark_url_lists(firewall_import, sizes, logger):
+    """
+    Time the original filter-per-name URL list conversion against the single grouping
+    pass and check that both serialise to identical url_lists.json content.
+    """
+    print(f"{'patterns':>8} {'lists':>6} {'per-name':>10} {'grouped':>10} {'speedup':>8}  identical")
+    for pattern_count in sizes:
+        df = synthetic_url_lists(pattern_count)
+
+        start = time.perf_counter()
+        reference = url_lists_filter_per_name(df)
+        reference_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = list(firewall_import.excel_to_json_url_lists({'url_lists': df}, logger)['url_lists.json'])
+        result_seconds = time.perf_counter() - start
+
+        identical = json.dumps(reference, indent=4) == json.dumps(result, indent=4)
+        print(f"{pattern_count:>8} {len(result):>6} {reference_seconds:>9.2f}s {result_seconds:>9.2f}s {reference_seconds / result_seconds:>7.1f}x  {identical}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the Firewall-import.py converters against their original implementations')
+    parser.add_argument('--only', choices=['security-rules', 'url-lists'], help='Run a single benchmark (default: all)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000], help='Rule counts to benchmark (default: 10000 100000 500000)')
+    parser.add_argument('--url-sizes', type=int, nargs='+', default=[20000, 200000], help='URL pattern counts to benchmark (default: 20000 200000)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logger = logging.getLogger("benchmark_import")
+    firewall_import = load_script("Firewall-import.py")
+
+    if args.only in (None, 'security-rules'):
+        print("Security rule conversion (iter_security_rules)")
+        benchmark_security_rules(firewall_import, args.sizes, logger)
+    if args.only in (None, 'url-lists'):
+        print("URL list conversion (excel_to_json_url_lists)")
+        benchmark_url_lists(firewall_import, args.url_sizes, logger)
+
+
+if __name__ == "__main__":
+    main()
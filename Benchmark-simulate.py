@@ -0,0 +1,183 @@
+import argparse
+import ipaddress
+import logging
+import os
+import random
+import time
+from script_loader import load_script
+
+
+def synthetic_policy(rule_count, seed=1):
+    """
+    Build the Firewall-import.py outputs for a policy with rule_count security rules:
+    address lists of /16-/32 prefixes in 10.0.0.0/8, TCP/UDP services with one or two
+    port ranges, ICMP applications, URL lists, and rules that mix all of them with
+    empty (match anything) conditions.
+    """
+    rng = random.Random(seed)
+    list_count = max(rule_count // 10, 10)
+
+    def prefix():
+        length = rng.choice([16, 20, 24, 24, 28, 32])
+        address = ipaddress.ip_address(0x0A000000 + rng.randrange(1 << 16) * 256 + rng.randrange(256))
+        return str(ipaddress.ip_network(f"{address}/{length}", strict=False))
+
+    iplists = [{'name': f"net-{i}", 'type': 'IP', 'addresses': [prefix() for _ in range(rng.randrange(1, 4))]} for i in range(list_count)]
+    services = []
+    for i in range(list_count):
+        port_ranges = []
+        for _ in range(rng.randrange(1, 3)):
+            first = rng.randrange(1, 65000)
+            port_ranges.append({'minimumPort': first, 'maximumPort': first + rng.choice([0, 0, 10, 500])})
+        services.append({'name': f"svc-{i}", 'type': rng.choice(['TCP_SERVICE', 'UDP_SERVICE']), 'portRanges': port_ranges})
+    service_lists = [{'name': f"svclist-{i}", 'services': rng.sample([service['name'] for service in services], 3)} for i in range(list_count)]
+    applications = [{'name': f"icmp-{i}", 'type': 'ICMP', 'icmpType': rng.choice([None, 0, 3, 8, 11]), 'icmpCode': None} for i in range(10)]
+    application_lists = [{'name': f"icmplist-{i}", 'apps': rng.sample([application['name'] for application in applications], 2)} for i in range(10)]
+    url_lists = [{'data': {'name': f"urls-{i}", 'urls': [{'pattern': f"*.site{i}-{j}.example.com", 'type': 'SIMPLE'} for j in range(5)]}} for i in range(20)]
+
+    def names(prefix, count, max_items):
+        # Mostly specific conditions, so a flow's first match tends to lie deep in the rule list
+        if rng.random() < 0.02:
+            return []
+        return [f"{prefix}-{rng.randrange(count)}" for _ in range(rng.randrange(1, max_items + 1))]
+
+    rules = []
+    for i in range(rule_count):
+        rules.append({
+            'name': f"rule-{i}",
+            'condition': {
+                'sourceAddress': names('net', list_count, 2),
+                'destinationAddress': names('net', list_count, 3),
+                'service': names('svclist', list_count, 2),
+                'url': names('urls', 20, 1) if rng.random() < 0.1 else [],
+                'application': names('icmplist', 10, 1) if rng.random() < 0.1 else [],
+            },
+            'position': {'afterRule': f"rule-{i - 1}"} if i else {},
+            'action': rng.choice(['ALLOW', 'DROP']),
+        })
+    return rules, iplists, services, service_lists, applications, application_lists, url_lists
+
+
+def synthetic_flows(iplists, flow_count, seed=2):
+    """Flows whose addresses mostly fall inside the address lists, so many rules are candidates."""
+    rng = random.Random(seed)
+    networks = [ipaddress.ip_network(address) for iplist in iplists for address in iplist['addresses']]
+
+    def address():
+        network = rng.choice(networks)
+        return str(network.network_address + rng.randrange(network.num_addresses))
+
+    flows = []
+    for _ in range(flow_count):
+        protocol = rng.choice(['tcp', 'tcp', 'udp', 'icmp', '47'])
+        port = rng.choice([0, 3, 8, 11]) if protocol == 'icmp' else rng.randrange(1, 65536)
+        url = f"www.site{rng.randrange(20)}-{rng.randrange(5)}.example.com" if rng.random() < 0.3 else None
+        flows.append((address(), address(), protocol, port, url))
+    return flows
+
+
+class LinearMatcher:
+    """
+    Reference first-match evaluation that resolves each rule's names and tests the
+    rules in order for every flow.
+    """
+    def __init__(self, rules, iplists, services, service_lists, applications, application_lists, url_lists, simulate):
+        self.simulate = simulate
+        networks = {iplist['name']: [ipaddress.ip_network(address, strict=False) for address in iplist['addresses']] for iplist in iplists}
+        service_by_name = {service['name']: service for service in services}
+        ports = {service_list['name']: [(simulate.SERVICE_PROTOCOLS[service_by_name[member]['type']], port_range['minimumPort'], port_range['maximumPort'])
+                                        for member in service_list['services'] for port_range in service_by_name[member]['portRanges']]
+                 for service_list in service_lists}
+        application_by_name = {application['name']: application for application in applications}
+        icmp_types = {application_list['name']: [application_by_name[member]['icmpType'] for member in application_list['apps']] for application_list in application_lists}
+        patterns = {url_list['data']['name']: [simulate.url_pattern_regex(url['pattern']) for url in url_list['data']['urls']] for url_list in url_lists}
+
+        def resolve(names):
+            resolved = []
+            for name in names:
+                resolved.extend(networks.get(name) or [ipaddress.ip_network(name, strict=False)])
+            return resolved
+
+        self.rules = []
+        for rule in rules:
+            condition = rule['condition']
+            self.rules.append((
+                resolve(condition['sourceAddress']),
+                resolve(condition['destinationAddress']),
+                [port_range for name in condition['service'] for port_range in ports[name]],
+                [icmp_type for name in condition['application'] for icmp_type in icmp_types[name]],
+                [pattern for name in condition['url'] for pattern in patterns[name]],
+                bool(condition['service'] or condition['application']),
+                bool(condition['url']),
+            ))
+
+    def match(self, src_ip, dst_ip, protocol, dst_port, url=None):
+        source = ipaddress.ip_address(src_ip)
+        destination = ipaddress.ip_address(dst_ip)
+        protocol = self.simulate.PROTOCOLS.get(protocol)
+        host = url.split('://', 1)[-1].lower() if url else ''
+        for index, (sources, destinations, port_ranges, icmp_types, patterns, has_service, has_url) in enumerate(self.rules):
+            if sources and not any(source in network for network in sources):
+                continue
+            if destinations and not any(destination in network for network in destinations):
+                continue
+            if has_service:
+                if protocol in ('tcp', 'udp'):
+                    if not any(port_protocol == protocol and first <= dst_port <= last for port_protocol, first, last in port_ranges):
+                        continue
+                elif protocol == 'icmp':
+                    if not any(icmp_type is None or icmp_type == dst_port for icmp_type in icmp_types):
+                        continue
+                else:
+                    continue
+            if has_url and not (host and any(pattern.match(host) or pattern.match(host.split('/', 1)[0]) for pattern in patterns)):
+                continue
+            return index
+        return None
+
+
+def benchmark_simulate(simulate, sizes, flow_count, logger):
+    """
+    Time the indexed simulator against a linear scan of the rules and check that
+    both pick the same rule for every flow.
+    """
+    print(f"{'rules':>8} {'flows':>8} {'index build':>12} {'linear':>10} {'indexed':>10} {'flows/s':>10} {'speedup':>8}  identical")
+    for rule_count in sizes:
+        policy = synthetic_policy(rule_count)
+        flows = synthetic_flows(policy[1], flow_count)
+
+        start = time.perf_counter()
+        simulator = simulate.PolicySimulator(*policy, logger)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = [simulator.match(*flow) for flow in flows]
+        result_seconds = time.perf_counter() - start
+
+        linear = LinearMatcher(*policy, simulate)
+        start = time.perf_counter()
+        reference = [linear.match(*flow) for flow in flows]
+        reference_seconds = time.perf_counter() - start
+
+        identical = reference == result
+        print(f"{rule_count:>8} {flow_count:>8} {build_seconds:>11.2f}s {reference_seconds:>9.2f}s {result_seconds:>9.2f}s {flow_count / result_seconds:>10.0f} {reference_seconds / result_seconds:>7.1f}x  {identical}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark Firewall-simulate.py rule matching against a linear scan of the rules')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Rule counts to benchmark (default: 1000 10000)')
+    parser.add_argument('--flows', type=int, default=5000, help='Flows evaluated per rule count (default: 5000)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logger = logging.getLogger("benchmark_simulate")
+    simulate = load_script("Firewall-simulate.py")
+
+    print("Flow matching (PolicySimulator.match)")
+    benchmark_simulate(simulate, args.sizes, args.flows, logger)
+
+
+if __name__ == "__main__":
+    main()
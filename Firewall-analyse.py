@@ -0,0 +1,487 @@
+import argparse
+import bisect
+import ipaddress
+import json
+import logging
+import os
+import sys
+import time
+from script_loader import load_script
+
+# Firewall-simulate.py loads the import outputs and provides the interval index the analysis reuses
+SIMULATE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Firewall-simulate.py')
+
+# Every address on one integer axis: IPv4 first, then IPv6
+IPV6_OFFSET = 1 << 32
+ADDRESS_SPACE = ((0, IPV6_OFFSET + (1 << 128) - 1),)
+
+# Every protocol on one integer axis: TCP ports, UDP ports, ICMP types, then one point for all other protocols
+SERVICE_OFFSETS = {'TCP_SERVICE': 0, 'UDP_SERVICE': 1 << 16}
+ICMP_OFFSET = 2 << 16
+OTHER_PROTOCOLS = ICMP_OFFSET + 256
+PROTOCOL_SPACE = ((0, OTHER_PROTOCOLS),)
+
+# Findings, in the order they are reported
+FINDINGS = ['unmatchable', 'shadowed', 'redundant', 'merged']
+
+def merge_intervals(intervals):
+    """Sort integer ranges and merge the overlapping and adjacent ones into a canonical tuple."""
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return tuple(merged)
+
+def network_interval(address):
+    """Return the range of a CIDR or address on the address axis, or None if it is not one."""
+    try:
+        network = ipaddress.ip_network(str(address).strip(), strict=False)
+    except ValueError:
+        return None
+    offset = IPV6_OFFSET if network.version == 6 else 0
+    return offset + int(network.network_address), offset + int(network.broadcast_address)
+
+class IntervalDimension:
+    """
+    One rule field whose values are sets of integers, held as merged ranges.
+
+    Rules with the same value share a set id. To find the rules whose value covers
+    (or intersects) a given set, each of the set's ranges is looked up in an
+    interval index over all distinct values: only the values containing the range's
+    start are candidates, so the work follows how deeply values overlap rather than
+    how many rules there are. Answers are rule bitsets, memoised per range and per
+    value, and a value's answer is the AND (or OR) of its ranges' answers.
+    """
+    def __init__(self, values, simulate):
+        self.set_ids = {}
+        rule_indices = []
+        for index, value in enumerate(values):
+            set_id = self.set_ids.setdefault(value, len(self.set_ids))
+            if set_id == len(rule_indices):
+                rule_indices.append([])
+            rule_indices[set_id].append(index)
+        self.set_rules = [simulate.bitset(indices) for indices in rule_indices]
+        ranges = [(first, last, (set_id, last)) for value, set_id in self.set_ids.items() for first, last in value]
+        self.index = simulate.IntervalIndex(ranges)
+        self.starts = sorted((first, set_id) for first, last, (set_id, _) in ranges)
+        self.all_rules = simulate.bitset(range(len(values)))
+        self.cover_cache = {}
+        self.intersect_cache = {}
+        self.interval_cover_cache = {}
+        self.interval_intersect_cache = {}
+
+    def rules_of(self, set_ids):
+        bits = 0
+        for set_id in set_ids:
+            bits |= self.set_rules[set_id]
+        return bits
+
+    def covering_rules(self, value):
+        """Bitset of the rules whose value contains every range of value."""
+        bits = self.cover_cache.get(value)
+        if bits is None:
+            bits = self.all_rules
+            for interval in value:
+                bits &= self.interval_covering_rules(*interval)
+                if not bits:
+                    break
+            self.cover_cache[value] = bits
+        return bits
+
+    def interval_covering_rules(self, first, last):
+        # Values are unions of shared lists, so the same ranges recur across many values
+        bits = self.interval_cover_cache.get((first, last))
+        if bits is None:
+            _, members = self.index.lookup(first)
+            bits = self.rules_of({set_id for set_id, end in members if end >= last})
+            self.interval_cover_cache[(first, last)] = bits
+        return bits
+
+    def intersecting_rules(self, value):
+        """Bitset of the rules whose value shares at least one integer with value."""
+        bits = self.intersect_cache.get(value)
+        if bits is None:
+            bits = 0
+            for interval in value:
+                bits |= self.interval_intersecting_rules(*interval)
+            self.intersect_cache[value] = bits
+        return bits
+
+    def interval_intersecting_rules(self, first, last):
+        bits = self.interval_intersect_cache.get((first, last))
+        if bits is None:
+            _, members = self.index.lookup(first)
+            set_ids = {set_id for set_id, _ in members}
+            low = bisect.bisect_right(self.starts, (first, float('inf')))
+            high = bisect.bisect_right(self.starts, (last, float('inf')))
+            set_ids.update(set_id for _, set_id in self.starts[low:high])
+            bits = self.rules_of(set_ids)
+            self.interval_intersect_cache[(first, last)] = bits
+        return bits
+
+class UrlDimension:
+    """
+    The URL field, whose values are sets of patterns (None for rules without a URL
+    condition). Wildcard patterns are compared as strings, so coverage is only
+    claimed when one rule lists every pattern of the other, and any two URL
+    conditions are assumed to intersect. Both keep the analysis on the safe side.
+    """
+    def __init__(self, values, simulate):
+        pattern_indices = {}
+        for index, value in enumerate(values):
+            for pattern in value or ():
+                pattern_indices.setdefault(pattern, []).append(index)
+        self.pattern_rules = {pattern: simulate.bitset(indices) for pattern, indices in pattern_indices.items()}
+        self.any_rules = simulate.bitset(index for index, value in enumerate(values) if value is None)
+        self.all_rules = simulate.bitset(range(len(values)))
+        self.cover_cache = {}
+
+    def covering_rules(self, value):
+        if value is None:
+            return self.any_rules
+        bits = self.cover_cache.get(value)
+        if bits is None:
+            bits = self.all_rules
+            for pattern in value:
+                bits &= self.pattern_rules[pattern]
+            bits |= self.any_rules
+            self.cover_cache[value] = bits
+        return bits
+
+    def intersecting_rules(self, value):
+        return self.all_rules
+
+class RuleSets:
+    """
+    Resolves every rule condition to the sets it matches on four fields: source
+    and destination addresses, protocol (TCP/UDP ports from service lists, ICMP
+    types from application lists) and URL patterns. Name resolution follows
+    Firewall-simulate.py, so a name that resolves to nothing matches nothing.
+    """
+    def __init__(self, rules, iplists, services, service_lists, applications, application_lists, url_lists, logger):
+        self.logger = logger
+        self.unresolved = set()
+        self.addresses = {}
+        for iplist in iplists:
+            intervals = [network_interval(address) for address in iplist.get('addresses', [])]
+            self.addresses[iplist['name']] = [interval for interval in intervals if interval]
+
+        service_by_name = {service['name']: service for service in services}
+        self.services = {}
+        for service_list in service_lists:
+            intervals = self.services.setdefault(service_list['name'], [])
+            for member in service_list.get('services', []):
+                service = service_by_name.get(member, {})
+                offset = SERVICE_OFFSETS.get(service.get('type'))
+                if offset is None:
+                    continue
+                for port_range in service.get('portRanges', []):
+                    if port_range.get('minimumPort') is not None and port_range.get('maximumPort') is not None:
+                        intervals.append((offset + port_range['minimumPort'], offset + port_range['maximumPort']))
+
+        application_by_name = {application['name']: application for application in applications}
+        self.applications = {}
+        icmp = ICMP_OFFSET
+        for application_list in application_lists:
+            intervals = self.applications.setdefault(application_list['name'], [])
+            for member in application_list.get('apps', []):
+                if member not in application_by_name:
+                    continue
+                icmp_type = application_by_name[member].get('icmpType')
+                intervals.append((icmp, icmp + 255) if icmp_type is None else (icmp + icmp_type, icmp + icmp_type))
+
+        self.url_patterns = {}
+        for url_list in url_lists:
+            url_list = url_list.get('data', url_list)
+            self.url_patterns.setdefault(url_list['name'], []).extend(url['pattern'].lower() for url in url_list.get('urls', []))
+
+        conditions = [rule.get('condition', {}) for rule in rules]
+        self.source = [self.address_value(condition.get('sourceAddress', [])) for condition in conditions]
+        self.destination = [self.address_value(condition.get('destinationAddress', [])) for condition in conditions]
+        self.protocol = [self.protocol_value(condition.get('service', []), condition.get('application', [])) for condition in conditions]
+        self.url = [self.url_value(condition.get('url', [])) for condition in conditions]
+
+        for name in sorted(self.unresolved, key=str):
+            logger.warning(f"'{name}' does not resolve to any address list, service list, application list or URL list; rules using it will not match on it")
+
+    def lookup(self, table, name):
+        if name not in table:
+            self.unresolved.add(name)
+        return table.get(name, [])
+
+    def address_value(self, names):
+        if not names:
+            return ADDRESS_SPACE
+        intervals = []
+        for name in names:
+            if name in self.addresses:
+                intervals.extend(self.addresses[name])
+            else:
+                # Addresses the converter could not map to a list name stay literal
+                interval = network_interval(name)
+                if interval:
+                    intervals.append(interval)
+                else:
+                    self.unresolved.add(name)
+        return merge_intervals(intervals)
+
+    def protocol_value(self, services, applications):
+        if not services and not applications:
+            return PROTOCOL_SPACE
+        intervals = []
+        for name in services:
+            intervals.extend(self.lookup(self.services, name))
+        for name in applications:
+            intervals.extend(self.lookup(self.applications, name))
+        return merge_intervals(intervals)
+
+    def url_value(self, names):
+        if not names:
+            return None
+        return frozenset(pattern for name in names for pattern in self.lookup(self.url_patterns, name))
+
+    def fields(self):
+        return [self.source, self.destination, self.protocol, self.url]
+
+def condition_keys(rule):
+    """A rule's condition as one comparable key per field; service and application lists form the protocol field."""
+    condition = rule.get('condition', {})
+    return (
+        tuple(sorted(set(condition.get('sourceAddress', [])))),
+        tuple(sorted(set(condition.get('destinationAddress', [])))),
+        (tuple(sorted(set(condition.get('service', [])))), tuple(sorted(set(condition.get('application', []))))),
+        tuple(sorted(set(condition.get('url', [])))),
+    )
+
+# The condition lists making up each field of condition_keys
+FIELD_CONDITIONS = [['sourceAddress'], ['destinationAddress'], ['service', 'application'], ['url']]
+
+# condition_keys values of a field with no condition, which matches anything
+ANY_KEYS = ((), ((), ()))
+
+def merge_rules(kept, rules, findings):
+    """
+    Merge runs of consecutive rules that have the same action and the same
+    condition in all fields but one, by joining that field's lists. Both rules
+    lead to the same action and nothing can match between them, so the merged
+    rule matches exactly the flows they did. Rules that match anything on the
+    differing field are left alone, as joining lists would narrow them.
+    """
+    merged_rules = []
+    for index in kept:
+        rule = rules[index]
+        if merged_rules:
+            previous = merged_rules[-1]
+            previous_keys, keys = condition_keys(previous), condition_keys(rule)
+            differing = [field for field in range(len(keys)) if previous_keys[field] != keys[field]]
+            if (previous.get('action') == rule.get('action') and len(differing) == 1
+                    and previous_keys[differing[0]] not in ANY_KEYS and keys[differing[0]] not in ANY_KEYS):
+                condition = dict(previous['condition'])
+                for name in FIELD_CONDITIONS[differing[0]]:
+                    condition[name] = list(dict.fromkeys(condition.get(name, []) + rule['condition'].get(name, [])))
+                merged_rules[-1] = dict(previous, condition=condition)
+                findings.append({'rule': rule['name'], 'finding': 'merged', 'by': previous['name'], 'action': rule.get('action')})
+                continue
+        merged_rules.append(rule)
+    return merged_rules
+
+def analyse_rules(rules, rule_sets, simulate, logger, merge=True):
+    """
+    Find the rules that can be dropped or merged without changing the action
+    taken on any flow, and return (findings, reduced rules).
+
+    - unmatchable: some field resolves to nothing, so the rule never matches.
+    - shadowed: an earlier rule covers it on every field with a different action,
+      so it never matches and its intended action never applies.
+    - redundant: an earlier rule covers it with the same action, or a later rule
+      with the same action covers it and no rule in between with a different
+      action overlaps it.
+    - merged: see merge_rules.
+
+    Each check is a few ANDs of rule bitsets per rule rather than a comparison with
+    every other rule. The reduced list is rechained with position.afterRule.
+    """
+    fields = rule_sets.fields()
+    dimensions = [IntervalDimension(fields[0], simulate), IntervalDimension(fields[1], simulate),
+                  IntervalDimension(fields[2], simulate), UrlDimension(fields[3], simulate)]
+    actions = {}
+    for index, rule in enumerate(rules):
+        actions.setdefault(rule.get('action'), []).append(index)
+    action_rules = {action: simulate.bitset(indices) for action, indices in actions.items()}
+
+    def covering(index):
+        bits = -1
+        for dimension, values in zip(dimensions, fields):
+            bits &= dimension.covering_rules(values[index])
+            if not bits:
+                break
+        return bits
+
+    findings = []
+    removed = set()
+    unmatchable = [index for index in range(len(rules)) if any(value is not None and not value for value in (fields[0][index], fields[1][index], fields[2][index], fields[3][index]))]
+    for index in unmatchable:
+        findings.append({'rule': rules[index]['name'], 'finding': 'unmatchable', 'by': None, 'action': rules[index].get('action')})
+        removed.add(index)
+    matchable = simulate.bitset(index for index in range(len(rules)) if index not in removed)
+
+    # A rule covered by an earlier one never matches; the earliest coverer is the one reported
+    for index, rule in enumerate(rules):
+        if index in removed:
+            continue
+        earlier = covering(index) & matchable & ((1 << index) - 1)
+        if earlier:
+            by = (earlier & -earlier).bit_length() - 1
+            finding = 'redundant' if rules[by].get('action') == rule.get('action') else 'shadowed'
+            findings.append({'rule': rule['name'], 'finding': finding, 'by': rules[by]['name'], 'action': rule.get('action')})
+            removed.add(index)
+
+    # Later rules are settled first, so each removal is checked against the list as already reduced
+    kept_rules = simulate.bitset(index for index in range(len(rules)) if index not in removed)
+    for index in range(len(rules) - 1, -1, -1):
+        if index in removed:
+            continue
+        action = rules[index].get('action')
+        later = covering(index) & kept_rules & action_rules[action] & ~((1 << (index + 1)) - 1)
+        if not later:
+            continue
+        by = (later & -later).bit_length() - 1
+        between = kept_rules & ~action_rules[action] & ((1 << by) - 1) & ~((1 << (index + 1)) - 1)
+        for dimension, values in zip(dimensions, fields):
+            if not between:
+                break
+            between &= dimension.intersecting_rules(values[index])
+        if not between:
+            findings.append({'rule': rules[index]['name'], 'finding': 'redundant', 'by': rules[by]['name'], 'action': action})
+            removed.add(index)
+            kept_rules &= ~(1 << index)
+
+    kept = [index for index in range(len(rules)) if index not in removed]
+    reduced = merge_rules(kept, rules, findings) if merge else [rules[index] for index in kept]
+
+    order = {rule['name']: index for index, rule in enumerate(rules)}
+    findings.sort(key=lambda finding: order.get(finding['rule'], len(rules)))
+
+    chained = []
+    for rule in reduced:
+        chained.append(dict(rule, position={'afterRule': chained[-1]['name']} if chained else {}))
+    return findings, chained
+
+def write_json(data, output_file):
+    """Write data as indented JSON under a temporary name and rename it into place."""
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_file, output_file)
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+        sys.exit(1)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def setup_logging(log_filename, logger_name, console_level, file_level):
+    """
+    setup_logging
+
+    Takes in
+    log_filename
+    logger_name
+    console_level
+    file_level
+
+    Returns logger
+    """
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(logging.DEBUG)
+    fh = logging.FileHandler(log_filename)
+    fh.setLevel(file_level)
+    ch = logging.StreamHandler()
+    ch.setLevel(console_level)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+def parse_arguments(logger):
+    """
+    parse_arguments
+
+    Takes in
+    logger
+
+    Returns args
+    """
+    logger.debug("Parsing args")
+    parser = argparse.ArgumentParser(description='Find shadowed, redundant and mergeable security rules in the JSON files written by Firewall-import.py')
+    parser.add_argument('-d', '--input-dir', default='.', help='Directory holding securityrules.json and the list files (default: current directory)')
+    parser.add_argument('-r', '--report', default='analysis_report.json', help='Where the findings are written (default: analysis_report.json)')
+    parser.add_argument('-o', '--output', help='Also write the reduced rule list to this file, in the securityrules.json format')
+    parser.add_argument('--no-merge', action='store_true', help='Only drop rules, never merge them')
+    args = parser.parse_args()
+    logger.debug("Done parsing args")
+    logger.debug(f"args = {args}")
+    return args
+
+
+def main():
+    try:
+        # set up logging stuff
+        logger = setup_logging(
+            log_filename="analyse_policies.log",
+            logger_name="analyse_policies",
+            console_level=logging.INFO,
+            file_level=logging.DEBUG
+        )
+        args = parse_arguments(logger)
+        logger.info(f"STARTING FIREWALL-ANALYSE.PY")
+
+        simulate = load_script(SIMULATE_SCRIPT)
+        rules = simulate.load_output(args.input_dir, 'securityrules.json')
+        if not rules:
+            print(f"No security rules found in '{args.input_dir}'. Run Firewall-import.py first or pass its output directory with -d.")
+            sys.exit(1)
+
+        start = time.perf_counter()
+        rule_sets = RuleSets(
+            rules,
+            simulate.load_output(args.input_dir, 'iplist.json'),
+            simulate.load_output(args.input_dir, 'service_input.json'),
+            simulate.load_output(args.input_dir, 'service_list_input.json'),
+            simulate.load_output(args.input_dir, 'application_input.json'),
+            simulate.load_output(args.input_dir, 'application_list_input.json'),
+            simulate.load_output(args.input_dir, 'url_lists.json'),
+            logger
+        )
+        findings, reduced = analyse_rules(rules, rule_sets, simulate, logger, merge=not args.no_merge)
+        logger.info(f"Analysed {len(rules)} rules in {time.perf_counter() - start:.2f}s")
+
+        for finding in findings:
+            logger.debug(f"{finding['finding']}: {finding['rule']} ({finding['action']})" + (f" by {finding['by']}" if finding['by'] else ""))
+        for kind in FINDINGS:
+            logger.info(f"  {sum(1 for finding in findings if finding['finding'] == kind):>8} {kind}")
+        logger.info(f"Rules: {len(rules)} -> {len(reduced)}")
+
+        write_json(findings, args.report)
+        logger.info(f"Findings written to {args.report}")
+        if args.output:
+            write_json(reduced, args.output)
+            logger.info(f"Reduced rule list written to {args.output}")
+
+        logger.info(f"FINISHED FIREWALL-ANALYSE.PY")
+    except SystemExit:
+        pass # nothing wrong here, just exit if we catch this
+
+    except BaseException as e:
+        logger.exception(f"Something went wrong:  {e}")
+
+
+if __name__ == "__main__":
+    main()
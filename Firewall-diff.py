@@ -0,0 +1,365 @@
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from script_loader import load_script
+
+# Scripts whose loaders are reused: streaming JSON from Convert-Policies.py, workbook conversion from Firewall-import.py
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONVERT_POLICIES_SCRIPT = os.path.join(SCRIPT_DIR, 'Firewall-export', 'Convert-Policies.py')
+FIREWALL_IMPORT_SCRIPT = os.path.join(SCRIPT_DIR, 'Firewall-import.py')
+
+# Object kinds of the normalised model, in report order
+KINDS = ['rules', 'address_lists', 'services', 'service_lists', 'applications', 'application_lists', 'url_lists']
+
+# Files each kind is read from in an Export-Policies.py export directory
+EXPORT_FILES = {
+    'rules': 'security_rule_output.json',
+    'address_lists': 'addresslist_output.json',
+    'services': 'service_output.json',
+    'service_lists': 'servicelist_output.json',
+    'applications': 'application_output.json',
+    'application_lists': 'applicationlist_output.json',
+    'url_lists': 'url_list_output.json',
+}
+
+# Files each kind is read from in a Firewall-import.py output directory
+IMPORT_FILES = {
+    'rules': 'securityrules.json',
+    'address_lists': 'iplist.json',
+    'services': 'service_input.json',
+    'service_lists': 'service_list_input.json',
+    'applications': 'application_input.json',
+    'application_lists': 'application_list_input.json',
+    'url_lists': 'url_lists.json',
+}
+
+def field(data, camel, hyphenated, default=None):
+    """Read a field spelt camelCase in the import JSON and hyphenated in the OCI CLI export."""
+    value = data.get(camel, data.get(hyphenated))
+    return default if value is None else value
+
+# The canonical functions map an exported or import object to (name, comparable dict).
+# Lists whose order does not matter to OCI are sorted, and read-only fields are dropped.
+
+def canonical_rule(data):
+    condition = field(data, 'condition', 'condition', {})
+    return data.get('name'), {
+        'action': data.get('action'),
+        'sourceAddress': sorted(field(condition, 'sourceAddress', 'source-address', [])),
+        'destinationAddress': sorted(field(condition, 'destinationAddress', 'destination-address', [])),
+        'service': sorted(condition.get('service') or []),
+        'application': sorted(condition.get('application') or []),
+        'url': sorted(condition.get('url') or []),
+    }
+
+def canonical_address_list(data):
+    return data.get('name'), {'type': data.get('type'), 'addresses': sorted(data.get('addresses') or [])}
+
+def canonical_service(data):
+    port_ranges = [[field(port_range, 'minimumPort', 'minimum-port'), field(port_range, 'maximumPort', 'maximum-port')]
+                   for port_range in field(data, 'portRanges', 'port-ranges', [])]
+    return data.get('name'), {'type': data.get('type'), 'portRanges': sorted(port_ranges, key=lambda port_range: [-1 if port is None else port for port in port_range])}
+
+def canonical_service_list(data):
+    return data.get('name'), {'services': sorted(data.get('services') or [])}
+
+def canonical_application(data):
+    return data.get('name'), {'type': data.get('type'), 'icmpType': field(data, 'icmpType', 'icmp-type'), 'icmpCode': field(data, 'icmpCode', 'icmp-code')}
+
+def canonical_application_list(data):
+    return data.get('name'), {'apps': sorted(data.get('apps') or [])}
+
+def canonical_url_list(data):
+    return data.get('name'), {'urls': sorted([url.get('pattern'), url.get('type')] for url in data.get('urls') or [])}
+
+CANONICAL = {
+    'rules': canonical_rule,
+    'address_lists': canonical_address_list,
+    'services': canonical_service,
+    'service_lists': canonical_service_list,
+    'applications': canonical_application,
+    'application_lists': canonical_application_list,
+    'url_lists': canonical_url_list,
+}
+
+def object_hash(obj):
+    """Stable digest of a canonical object."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def iter_json_file(path, convert_policies):
+    """Yield the objects of a JSON array file one at a time, or of a .jsonl file line by line."""
+    if path.endswith('.jsonl'):
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from convert_policies.iter_json_array(path)
+
+def snapshot_files(path):
+    """
+    Work out what a snapshot path holds: 'export' or 'import' directory (by the
+    security rule file it contains) or a 'workbook' to be converted.
+    """
+    if os.path.isdir(path):
+        if os.path.exists(os.path.join(path, EXPORT_FILES['rules'])):
+            return 'export', EXPORT_FILES
+        for filename in (IMPORT_FILES['rules'], IMPORT_FILES['rules'][:-len('.json')] + '.jsonl'):
+            if os.path.exists(os.path.join(path, filename)):
+                return 'import', IMPORT_FILES
+        print(f"'{path}' holds neither {EXPORT_FILES['rules']} (Export-Policies.py) nor {IMPORT_FILES['rules']} (Firewall-import.py).")
+        sys.exit(1)
+    if path.endswith('.xlsx'):
+        return 'workbook', None
+    print(f"'{path}' is not a directory or an .xlsx workbook.")
+    sys.exit(1)
+
+def import_objects(outputs):
+    """Key Firewall-import.py converter outputs, by output filename, by kind."""
+    return {kind: outputs.get(filename, []) for kind, filename in IMPORT_FILES.items()}
+
+def workbook_objects(excel_file, logger, reader):
+    """Convert a workbook in memory with Firewall-import.py's converters, keyed by kind."""
+    firewall_import = load_script(FIREWALL_IMPORT_SCRIPT)
+    sheets = firewall_import.load_workbook_sheets(excel_file, logger, reader)
+    return import_objects(firewall_import.convert_objects(sheets, logger))
+
+def load_snapshot(path, logger, reader='openpyxl', keep_raw=False):
+    """
+    Load an export directory, an import directory or a workbook into the normalised
+    model of snapshot_model.
+    """
+    source, files = snapshot_files(path)
+    if source == 'workbook':
+        objects = workbook_objects(path, logger, reader)
+    else:
+        convert_policies = load_script(CONVERT_POLICIES_SCRIPT)
+        objects = {}
+        for kind, filename in files.items():
+            file_path = os.path.join(path, filename)
+            jsonl_path = file_path[:-len('.json')] + '.jsonl'
+            if source == 'import' and not os.path.exists(file_path) and os.path.exists(jsonl_path):
+                file_path = jsonl_path
+            objects[kind] = iter_json_file(file_path, convert_policies) if os.path.exists(file_path) else []
+    return snapshot_model(objects, source, path, logger, keep_raw)
+
+def snapshot_model(objects, source, path, logger, keep_raw=False):
+    """
+    Normalise `objects` ({kind: iterable of objects} read from `path`) into the
+    model: {kind: {name: canonical object}}, with rules in evaluation order. Objects
+    are canonicalised one at a time as they are read. With keep_raw, the objects as
+    read are also returned, under model['raw'].
+    """
+    model = {'source': source}
+    raw = {}
+    try:
+        for kind in KINDS:
+            entries = {}
+            priorities = {}
+            for item in objects[kind]:
+                data = item.get('data', item)
+                name, canonical = CANONICAL[kind](data)
+                if name in entries:
+                    logger.warning(f"{path}: duplicate {kind} name '{name}', keeping the last one")
+                entries[name] = canonical
+                if keep_raw:
+                    raw.setdefault(kind, {})[name] = data
+                if 'priority-order' in data:
+                    priorities[name] = data['priority-order']
+            if kind == 'rules' and priorities:
+                # Exported rules carry their position as priority-order rather than file order
+                entries = dict(sorted(entries.items(), key=lambda entry: priorities.get(entry[0], float('inf'))))
+            model[kind] = entries
+    except json.JSONDecodeError as e:
+        print(f"Error reading '{path}': {e}")
+        sys.exit(1)
+    if keep_raw:
+        model['raw'] = raw
+    return model
+
+def ordered_in_place(old_order, new_order):
+    """
+    Return the names common to both orders that can stay where they are: the
+    longest run of them that keeps its relative order, found in O(n log n) as a
+    longest increasing subsequence of old positions. Every other common name has
+    to move to turn old_order into new_order.
+    """
+    old_position = {name: position for position, name in enumerate(old_order)}
+    common = [name for name in new_order if name in old_position]
+    tails = []
+    tail_names = []
+    previous = {}
+    for name in common:
+        position = old_position[name]
+        slot = bisect.bisect_left(tails, position)
+        previous[name] = tail_names[slot - 1] if slot else None
+        if slot == len(tails):
+            tails.append(position)
+            tail_names.append(name)
+        else:
+            tails[slot] = position
+            tail_names[slot] = name
+    in_place = set()
+    name = tail_names[-1] if tail_names else None
+    while name is not None:
+        in_place.add(name)
+        name = previous[name]
+    return in_place
+
+def field_changes(old, new):
+    """The fields of two canonical objects that differ, as {field: {'old': ..., 'new': ...}}."""
+    return {key: {'old': old.get(key), 'new': new.get(key)} for key in sorted(set(old) | set(new)) if old.get(key) != new.get(key)}
+
+def object_hashes(model):
+    """Every object's hash, as {kind: {name: hash}}."""
+    return {kind: {name: object_hash(obj) for name, obj in model[kind].items()} for kind in KINDS}
+
+def policy_digest(model, hashes):
+    """One digest for the whole policy, from every object's hash and the rule order."""
+    digest = hashlib.sha256()
+    for kind in KINDS:
+        for name in (model[kind] if kind == 'rules' else sorted(model[kind], key=str)):
+            digest.update(json.dumps([kind, name, hashes[kind][name]]).encode())
+    return digest.hexdigest()
+
+def diff_snapshots(old, new):
+    """
+    Compare two normalised models in time linear in their size: objects are
+    matched by name within each kind and compared by hash, and only objects whose
+    hashes differ are compared field by field. Rules present in both whose
+    relative order changed are reported as moved.
+    """
+    old_hashes, new_hashes = object_hashes(old), object_hashes(new)
+    report = {'summary': {}, 'changes': {}}
+    for kind in KINDS:
+        old_objects, new_objects = old[kind], new[kind]
+        changes = {
+            'added': [name for name in new_objects if name not in old_objects],
+            'removed': [name for name in old_objects if name not in new_objects],
+            'modified': [],
+        }
+        unchanged = 0
+        for name, obj in new_objects.items():
+            if name in old_objects:
+                if new_hashes[kind][name] == old_hashes[kind][name]:
+                    unchanged += 1
+                else:
+                    changes['modified'].append({'name': name, 'changes': field_changes(old_objects[name], obj)})
+        if kind == 'rules':
+            in_place = ordered_in_place(list(old_objects), list(new_objects))
+            changes['moved'] = [name for name in new_objects if name in old_objects and name not in in_place]
+        report['summary'][kind] = {change: len(names) for change, names in changes.items()}
+        report['summary'][kind]['unchanged'] = unchanged
+        report['changes'][kind] = changes
+    report['old_digest'] = policy_digest(old, old_hashes)
+    report['new_digest'] = policy_digest(new, new_hashes)
+    report['identical'] = report['old_digest'] == report['new_digest']
+    return report
+
+def write_report(report, output_file):
+    """Write the report as indented JSON under a temporary name and rename it into place."""
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(report, f, indent=4)
+        os.replace(temp_file, output_file)
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+        sys.exit(1)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def setup_logging(log_filename, logger_name, console_level, file_level):
+    """
+    setup_logging
+
+    Takes in
+    log_filename
+    logger_name
+    console_level
+    file_level
+
+    Returns logger
+    """
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(logging.DEBUG)
+    fh = logging.FileHandler(log_filename)
+    fh.setLevel(file_level)
+    ch = logging.StreamHandler()
+    ch.setLevel(console_level)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+def parse_arguments(logger):
+    """
+    parse_arguments
+
+    Takes in
+    logger
+
+    Returns args
+    """
+    logger.debug("Parsing args")
+    parser = argparse.ArgumentParser(description='Compare two policy snapshots: Export-Policies.py export directories, Firewall-import.py output directories or workbooks')
+    parser.add_argument('old', help='The snapshot to compare from')
+    parser.add_argument('new', help='The snapshot to compare to')
+    parser.add_argument('-o', '--output', default='diff_report.json', help='Where the report is written (default: diff_report.json)')
+    parser.add_argument('-r', '--reader', choices=['openpyxl', 'calamine', 'read-only-stream'], default='openpyxl', help='Workbook reader for .xlsx snapshots (default: openpyxl)')
+    args = parser.parse_args()
+    logger.debug("Done parsing args")
+    logger.debug(f"args = {args}")
+    return args
+
+
+def main():
+    try:
+        # set up logging stuff
+        logger = setup_logging(
+            log_filename="diff_policies.log",
+            logger_name="diff_policies",
+            console_level=logging.INFO,
+            file_level=logging.DEBUG
+        )
+        args = parse_arguments(logger)
+        logger.info(f"STARTING FIREWALL-DIFF.PY")
+
+        start = time.perf_counter()
+        old = load_snapshot(args.old, logger, args.reader)
+        new = load_snapshot(args.new, logger, args.reader)
+        logger.info(f"Loaded {old['source']} '{args.old}' and {new['source']} '{args.new}' in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        report = diff_snapshots(old, new)
+        report['old'] = {'path': args.old, 'source': old['source']}
+        report['new'] = {'path': args.new, 'source': new['source']}
+        logger.info(f"Compared in {time.perf_counter() - start:.2f}s")
+
+        if report['identical']:
+            logger.info("The snapshots are identical")
+        for kind in KINDS:
+            summary = report['summary'][kind]
+            logger.info(f"  {kind:<18} " + " ".join(f"{change} {count:>6}" for change, count in summary.items()))
+        write_report(report, args.output)
+        logger.info(f"Report written to {args.output}")
+
+        logger.info(f"FINISHED FIREWALL-DIFF.PY")
+    except SystemExit:
+        pass # nothing wrong here, just exit if we catch this
+
+    except BaseException as e:
+        logger.exception(f"Something went wrong:  {e}")
+
+
+if __name__ == "__main__":
+    main()
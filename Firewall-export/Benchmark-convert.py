@@ -0,0 +1,161 @@
+import argparse
+import logging
+import os
+import sys
+import time
+import pandas as pd
+
+# script_loader.py lives in the repository root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from script_loader import load_script  # noqa: E402
+
+
+def synthetic_export(export_policies, rule_count):
+    """
+    Build the contents of the *_output.json files for a synthetic policy with
+    rule_count security rules, keyed by output file name.
+    """
+    policy = export_policies.build_fake_policy("ocid1.networkfirewallpolicy.oc1..benchmark", rule_count)
+    return {output_file: [{"data": item} for item in policy[resource]] for resource, _, output_file in export_policies.EXPORT_RESOURCES}
+
+
+def build_sheets_concat(export_data, extract_port_ranges):
+    """
+    Reference copy of the original Convert-Policies.py frame assembly, which grows
+    each sheet with one pd.concat per exported item.
+    """
+    security_rules_df = pd.DataFrame()
+    for rule in export_data["security_rule_output.json"]:
+        rule_data = rule.get('data', {})
+        condition_tree = rule_data.get('condition', {})
+        security_rules_df = pd.concat([security_rules_df, pd.DataFrame({
+            'name': [rule_data.get('name')],
+            'Source Address Lists': [", ".join(condition_tree.get('source-address', []))],
+            'Destination Address Lists': [", ".join(condition_tree.get('destination-address', []))],
+            'Service Lists': [", ".join(condition_tree.get('service', []))],
+            'Application Lists': [", ".join(condition_tree.get('application', []))],
+            'Url Lists': [", ".join(condition_tree.get('url', []))],
+            'Action': [rule_data.get('action')]
+        })])
+
+    urls_to_append = []
+    url_list_df = pd.DataFrame()
+    for item in export_data["url_list_output.json"]:
+        name = item['data'].get('name')
+        for url in item['data'].get('urls', []):
+            urls_to_append.append({'name': name, 'pattern': url.get('pattern', '')})
+            url_list_df = pd.DataFrame(urls_to_append)
+
+    iplist_df = pd.DataFrame()
+    for entry in export_data["addresslist_output.json"]:
+        entry_data = entry.get('data', {})
+        iplist_df = pd.concat([iplist_df, pd.DataFrame({
+            'name': [entry_data.get('name')],
+            'addresses': [", ".join(entry_data.get('addresses', []))]
+        })])
+
+    service_individual_df = pd.DataFrame()
+    for entry in export_data["service_output.json"]:
+        entry_data = entry.get('data', {})
+        minimum_ports, maximum_ports = extract_port_ranges(entry_data.get('port-ranges', []))
+        service_individual_df = pd.concat([service_individual_df, pd.DataFrame({
+            'name': [entry_data.get('name')],
+            'type': [entry_data.get('type')],
+            'minimumPort': [", ".join(map(str, minimum_ports))],
+            'maximumPort': [", ".join(map(str, maximum_ports))]
+        })])
+
+    applications = [entry.get('data', {}) for entry in export_data["application_output.json"]]
+    df_Application = pd.DataFrame({
+        'name': [data.get('name') for data in applications],
+        'type': 'ICMP_TYPE',
+        'icmpType': [data.get('icmp-type') for data in applications]
+    })
+    service_lists = [entry.get('data', {}) for entry in export_data["servicelist_output.json"] if entry.get('data', {}).get('services', [])]
+    df_new_services = pd.DataFrame({
+        'name': [data.get('name') for data in service_lists],
+        'type': 'SERVICE_GROUP',
+        'services': [", ".join(data['services']) for data in service_lists]
+    })
+    application_lists = [entry.get('data', {}) for entry in export_data["applicationlist_output.json"] if entry.get('data', {}).get('apps', [])]
+    df_applist_services = pd.DataFrame({
+        'name': [data.get('name') for data in application_lists],
+        'type': 'ICMP_GROUP',
+        'services': [", ".join(data['apps']) for data in application_lists]
+    })
+    combined_services_df = pd.concat([pd.DataFrame(), service_individual_df, df_new_services, df_Application, df_applist_services], ignore_index=True)
+
+    return {
+        'security-rules': security_rules_df,
+        'iplist': iplist_df,
+        'url_lists': url_list_df,
+        'service': combined_services_df,
+    }
+
+
+def build_sheets_records(convert_policies, export_data, logger):
+    """Assemble the sheets with the record builders in Convert-Policies.py."""
+    return {
+        'security-rules': pd.DataFrame(convert_policies.security_rule_records(export_data["security_rule_output.json"])),
+        'iplist': pd.DataFrame(convert_policies.iplist_records(export_data["addresslist_output.json"])),
+        'url_lists': pd.DataFrame(convert_policies.url_list_records(export_data["url_list_output.json"])),
+        'service': convert_policies.build_service_frame(
+            convert_policies.service_records(export_data["service_output.json"]),
+            convert_policies.application_records(export_data["application_output.json"]),
+            convert_policies.service_list_records(export_data["servicelist_output.json"], logger),
+            convert_policies.application_list_records(export_data["applicationlist_output.json"])
+        ),
+    }
+
+
+def sheets_identical(reference, result):
+    """Compare sheets cell for cell, ignoring the row index (the sheets are written with index=False)."""
+    return all(reference[name].reset_index(drop=True).equals(result[name].reset_index(drop=True)) for name in reference)
+
+
+def benchmark_convert(export_policies, convert_policies, sizes, logger, skip_reference_above):
+    """
+    Time the per-item pd.concat assembly against the record builders and report the
+    cost per security rule, which stays flat when assembly is linear.
+    """
+    print(f"{'rules':>8} {'concat':>10} {'records':>10} {'concat/rule':>12} {'records/rule':>13} {'speedup':>8}  identical")
+    for rule_count in sizes:
+        export_data = synthetic_export(export_policies, rule_count)
+
+        start = time.perf_counter()
+        result = build_sheets_records(convert_policies, export_data, logger)
+        result_seconds = time.perf_counter() - start
+        result_per_rule = f"{result_seconds / rule_count * 1e6:>10.1f}us"
+
+        if rule_count > skip_reference_above:
+            print(f"{rule_count:>8} {'-':>10} {result_seconds:>9.2f}s {'-':>12} {result_per_rule:>13} {'-':>8}  -")
+            continue
+
+        start = time.perf_counter()
+        reference = build_sheets_concat(export_data, convert_policies.extract_port_ranges)
+        reference_seconds = time.perf_counter() - start
+        reference_per_rule = f"{reference_seconds / rule_count * 1e6:>9.1f}us"
+
+        identical = sheets_identical(reference, result)
+        print(f"{rule_count:>8} {reference_seconds:>9.2f}s {result_seconds:>9.2f}s {reference_per_rule:>12} {result_per_rule:>13} {reference_seconds / result_seconds:>7.1f}x  {identical}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark Convert-Policies.py sheet assembly against the original per-item pd.concat loops')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='Security rule counts to benchmark (default: 1000 5000 20000)')
+    parser.add_argument('--skip-reference-above', type=int, default=20000, help='Only time the original assembly up to this many rules (default: 20000)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logger = logging.getLogger("benchmark_convert")
+    export_policies = load_script("Firewall-export/Export-Policies.py")
+    convert_policies = load_script("Firewall-export/Convert-Policies.py")
+
+    print("Sheet assembly (Convert-Policies.py)")
+    benchmark_convert(export_policies, convert_policies, args.sizes, logger, args.skip_reference_above)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,22 @@
 import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 import json
 import os
 import logging
+from policy_json import iter_json_array
 
 def setup_logging(log_filename, logger_name, console_level, file_level):
     """
     setup_logging
-    
+
     Takes in
     log_filename
     logger_name
     console_level
     file_level
-    
+
     Returns logger
     """
     logger = logging.getLogger(logger_name)
@@ -38,200 +41,197 @@ def extract_port_ranges(port_ranges):
         maximum_ports.append(port_range.get('maximum-port'))
     return minimum_ports, maximum_ports
 
-# Function to load JSON data
+# Function to load JSON data, one exported item at a time
 def load_json(file_path):
-    with open(file_path, "r") as file:
-        return json.load(file)
-
-
-
-## MAIN
-
-# set up logging stuff
-logger = setup_logging(
-    log_filename="convert_policies.log", 
-    logger_name="convert_policies", 
-    console_level=logging.INFO, 
-    file_level=logging.DEBUG
-)
-
-# Load existing Excel file if it exists
-output_file = "output.xlsx"
-existing_sheets = {}
-if os.path.exists(output_file):
-    logger.debug(f'existing file found, purging and recreating.')
-    os.remove(output_file)
-    pd.DataFrame().to_excel(output_file, index=False)
-else:
-    # Create the Excel file with an empty DataFrame
-    logger.debug(f'No file found, creating.')
-    pd.DataFrame().to_excel(output_file, index=False)
-
-# Process 'security-rule' data
-logger.debug(f'-Processing Security Rules-')
-security_rules_data = load_json("security_rule_output.json")
-security_rules_df = pd.DataFrame()
-for rule in security_rules_data:
-    rule_data = rule.get('data', {})
-    condition_tree = rule_data.get('condition', {})
-    security_rules_df = pd.concat([security_rules_df, pd.DataFrame({
-        'name': [rule_data.get('name')],
-        'Source Address Lists': [", ".join(condition_tree.get('source-address', []))],
-        'Destination Address Lists': [", ".join(condition_tree.get('destination-address', []))],
-        'Service Lists': [", ".join(condition_tree.get('service', []))],
-        'Application Lists': [", ".join(condition_tree.get('application', []))],
-        'Url Lists': [", ".join(condition_tree.get('url', []))],
-        'Action': [rule_data.get('action')]
-    })])
-
-# Process 'url-list' data
-logger.debug(f'-Processing URL Lists-')
-url_list_data = load_json("url_list_output.json")
-urls_to_append = []
-url_list_df = pd.DataFrame()
-for item in url_list_data:
-    name = item['data'].get('name')
-    #print(item['data'].get('name'))
-    urls = item['data'].get('urls', [])
-    #print(item['data'].get('urls', []))
-    for url in urls:
-        pattern = url.get('pattern', '')
-        urls_to_append.append({'name': name, 'pattern': pattern})
-        url_list_df = pd.DataFrame(urls_to_append)
-#print(url_list_df)
-
-
-# Process 'iplist' data
-logger.debug(f'-Processing IP Lists-')
-iplist_data = load_json("addresslist_output.json")
-iplist_df = pd.DataFrame()
-for entry in iplist_data:
-    entry_data = entry.get('data', {})
-    iplist_df = pd.concat([iplist_df, pd.DataFrame({
-        'name': [entry_data.get('name')],
-        'addresses': [", ".join(entry_data.get('addresses', []))]
-    })])
-
-# Write 'security-rules' and 'iplist' and url_lists sheets
-logger.debug(f'-Writing security-rules, iplist, and url_lists sheets-')
-
-with pd.ExcelWriter(output_file, mode='a', if_sheet_exists='replace') as writer:
-    security_rules_df.to_excel(writer, sheet_name='security-rules', index=False)
-    iplist_df.to_excel(writer, sheet_name='iplist', index=False)
-    url_list_df.to_excel(writer, sheet_name='url_lists', index=False)
-
-
-# Load existing 'service' sheet from the output Excel file or create it if it doesn't exist
-if 'service' in existing_sheets:
-    existing_services_df = existing_sheets['service']
-else:
-    logger.debug(f'creating service sheet')
-    existing_services_df = pd.DataFrame()
-
-# Process 'service' data
-service_data = load_json("service_output.json")
-service_individual_df = pd.DataFrame()  # Separate dataframe for individual services
-logger.debug(f'creating individual services from json')
-for entry in service_data:
-    entry_data = entry.get('data', {})
-    minimum_ports, maximum_ports = extract_port_ranges(entry_data.get('port-ranges', []))
-    service_individual_df = pd.concat([service_individual_df, pd.DataFrame({
-        'name': [entry_data.get('name')],
-        'type': [entry_data.get('type')],
-        'minimumPort': [", ".join(map(str, minimum_ports))],
-        'maximumPort': [", ".join(map(str, maximum_ports))]
-    })])
-
-# Process 'Application list' data
-Application_group_data = load_json("application_output.json")
-Application_group_df = pd.DataFrame()  # Separate dataframe for application groups
-# Initialize lists to store data
-app_names = []
-icmp_types = []
-
-# Extract data from JSON
-logger.debug(f'creating applications from json')
-for entry in Application_group_data:
-    data = entry.get('data', {})
-    app_names.append(data.get('name'))
-    icmp_types.append(data.get('icmp-type'))
-
-# Create DataFrame from new data
-df_Application = pd.DataFrame({
-    'name': app_names,
-    'type': 'ICMP_TYPE',
-    'icmpType': icmp_types
-})
-
-# Process 'service list' data
-service_group_data = load_json("servicelist_output.json")
-service_group_df = pd.DataFrame()  # Separate dataframe for service groups
-# Initialize lists to store data
-group_names = []
-group_services = []
-
-# Extract data from JSON
-logger.debug(f'creating service groups from json')
-for entry in service_group_data:
-
-    data = entry.get('data', {})
-    logger.debug(f'service group data: {data}')
-    services_list = data.get('services', [])
-    logger.debug(f'service list services: {services_list}')
-
-    if len(services_list) >= 1:
-        group_names.append(data.get('name'))
-        group_services.append(", ".join(services_list))
-
-# Create DataFrame from new data
-df_new_services = pd.DataFrame({
-    'name': group_names,
-    'type': 'SERVICE_GROUP',
-    'services': group_services
-})
-
-# Process 'Application list' data
-Application_group_data = load_json("applicationlist_output.json")
-Application_group_df = pd.DataFrame()  # Separate dataframe for service groups
-# Initialize lists to store data
-grp_names = []
-grp_services = []
-
-# Extract data from JSON
-for entry in Application_group_data:
-    data = entry.get('data', {})
-    services_list = data.get('apps', [])
-    if len(services_list) >= 1:
-        grp_names.append(data.get('name'))
-        grp_services.append(", ".join(services_list))
-
-# Create DataFrame from new data
-df_applist_services = pd.DataFrame({
-    'name': grp_names,
-    'type': 'ICMP_GROUP',
-    'services': grp_services
-})
-
-# Write 'service' sheet
-with pd.ExcelWriter(output_file, mode='a', if_sheet_exists='replace') as writer:
-    combined_services_df = pd.concat([existing_services_df, service_individual_df, df_new_services, df_Application, df_applist_services], ignore_index=True)
-    combined_services_df.to_excel(writer, sheet_name='service', index=False)
-    # Write other sheets
-    for sheet_name, df in existing_sheets.items():
-        if sheet_name not in ['security-rules', 'iplist', 'service', 'url_lists']:
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-print()
-
-#makes sure sheet1 isnt in the file.
-wb = load_workbook("output.xlsx")
-# Check if the sheet exists
-if "Sheet1" in wb.sheetnames:
-    # Get the sheet
-    sheet = wb["Sheet1"]
-    # Remove the sheet
-    wb.remove(sheet)
-
-# Save the changes
-wb.save("output.xlsx")
-
-print("Excel file created and updated successfully.")
+    return iter_json_array(file_path)
+
+# Header cells get the same bold, bordered style that pandas' to_excel applies
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+def header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = HEADER_FONT
+    cell.border = HEADER_BORDER
+    cell.alignment = HEADER_ALIGNMENT
+    return cell
+
+# The record functions below map exported items to sheet rows. They only build
+# plain dicts; each sheet's DataFrame is created once from the full record list.
+
+def security_rule_records(security_rules_data):
+    """Rows of the 'security-rules' sheet, one per exported security rule."""
+    records = []
+    for rule in security_rules_data:
+        rule_data = rule.get('data', {})
+        condition_tree = rule_data.get('condition', {})
+        records.append({
+            'name': rule_data.get('name'),
+            'Source Address Lists': ", ".join(condition_tree.get('source-address', [])),
+            'Destination Address Lists': ", ".join(condition_tree.get('destination-address', [])),
+            'Service Lists': ", ".join(condition_tree.get('service', [])),
+            'Application Lists': ", ".join(condition_tree.get('application', [])),
+            'Url Lists': ", ".join(condition_tree.get('url', [])),
+            'Action': rule_data.get('action')
+        })
+    return records
+
+def url_list_records(url_list_data):
+    """Rows of the 'url_lists' sheet, one per URL pattern."""
+    records = []
+    for item in url_list_data:
+        name = item['data'].get('name')
+        for url in item['data'].get('urls', []):
+            records.append({'name': name, 'pattern': url.get('pattern', '')})
+    return records
+
+def iplist_records(iplist_data):
+    """Rows of the 'iplist' sheet, one per exported address list."""
+    records = []
+    for entry in iplist_data:
+        entry_data = entry.get('data', {})
+        records.append({
+            'name': entry_data.get('name'),
+            'addresses': ", ".join(entry_data.get('addresses', []))
+        })
+    return records
+
+def service_records(service_data):
+    """'service' sheet rows for individual TCP/UDP services."""
+    records = []
+    for entry in service_data:
+        entry_data = entry.get('data', {})
+        minimum_ports, maximum_ports = extract_port_ranges(entry_data.get('port-ranges', []))
+        records.append({
+            'name': entry_data.get('name'),
+            'type': entry_data.get('type'),
+            'minimumPort': ", ".join(map(str, minimum_ports)),
+            'maximumPort': ", ".join(map(str, maximum_ports))
+        })
+    return records
+
+def application_records(application_data):
+    """'service' sheet rows for ICMP applications."""
+    return [{'name': entry.get('data', {}).get('name'), 'icmpType': entry.get('data', {}).get('icmp-type')} for entry in application_data]
+
+def service_list_records(service_list_data, logger):
+    """'service' sheet rows for service lists that have at least one member."""
+    records = []
+    for entry in service_list_data:
+        data = entry.get('data', {})
+        logger.debug(f'service group data: {data}')
+        services_list = data.get('services', [])
+        logger.debug(f'service list services: {services_list}')
+        if len(services_list) >= 1:
+            records.append({'name': data.get('name'), 'services': ", ".join(services_list)})
+    return records
+
+def application_list_records(application_list_data):
+    """'service' sheet rows for application groups that have at least one member."""
+    records = []
+    for entry in application_list_data:
+        data = entry.get('data', {})
+        services_list = data.get('apps', [])
+        if len(services_list) >= 1:
+            records.append({'name': data.get('name'), 'services': ", ".join(services_list)})
+    return records
+
+def build_service_frame(service_rows, application_rows, service_list_rows, application_list_rows):
+    """
+    Build the 'service' sheet: individual services, then service groups, ICMP types
+    and ICMP groups, each section's frame created once and concatenated once.
+    """
+    service_individual_df = pd.DataFrame(service_rows)
+    df_new_services = pd.DataFrame({
+        'name': [row['name'] for row in service_list_rows],
+        'type': 'SERVICE_GROUP',
+        'services': [row['services'] for row in service_list_rows]
+    })
+    df_Application = pd.DataFrame({
+        'name': [row['name'] for row in application_rows],
+        'type': 'ICMP_TYPE',
+        'icmpType': [row['icmpType'] for row in application_rows]
+    })
+    df_applist_services = pd.DataFrame({
+        'name': [row['name'] for row in application_list_rows],
+        'type': 'ICMP_GROUP',
+        'services': [row['services'] for row in application_list_rows]
+    })
+    return pd.concat([service_individual_df, df_new_services, df_Application, df_applist_services], ignore_index=True)
+
+def build_sheets(export_dir, logger):
+    """
+    Read the *_output.json export files in export_dir and return the workbook's
+    sheets as DataFrames, in the order they are written.
+    """
+    def export_file(filename):
+        return load_json(os.path.join(export_dir, filename))
+
+    logger.debug(f'-Processing Security Rules-')
+    security_rules_df = pd.DataFrame(security_rule_records(export_file("security_rule_output.json")))
+
+    logger.debug(f'-Processing URL Lists-')
+    url_list_df = pd.DataFrame(url_list_records(export_file("url_list_output.json")))
+
+    logger.debug(f'-Processing IP Lists-')
+    iplist_df = pd.DataFrame(iplist_records(export_file("addresslist_output.json")))
+
+    logger.debug(f'creating individual services from json')
+    service_rows = service_records(export_file("service_output.json"))
+    logger.debug(f'creating applications from json')
+    application_rows = application_records(export_file("application_output.json"))
+    logger.debug(f'creating service groups from json')
+    service_list_rows = service_list_records(export_file("servicelist_output.json"), logger)
+    application_list_rows = application_list_records(export_file("applicationlist_output.json"))
+    combined_services_df = build_service_frame(service_rows, application_rows, service_list_rows, application_list_rows)
+
+    return {
+        'security-rules': security_rules_df,
+        'iplist': iplist_df,
+        'url_lists': url_list_df,
+        'service': combined_services_df,
+    }
+
+def sheet_rows(ws, df):
+    """Yield a sheet's header and data rows, with missing values as empty cells."""
+    yield [header_cell(ws, column) for column in df.columns]
+    for row in df.itertuples(index=False, name=None):
+        yield [None if pd.isna(value) else value for value in row]
+
+def write_workbook(sheets, output_file, logger):
+    """
+    Write every sheet to output_file in one pass through a write-only workbook,
+    which streams rows to disk instead of holding the whole workbook in memory.
+    """
+    if os.path.exists(output_file):
+        logger.debug(f'existing file found, purging and recreating.')
+    else:
+        logger.debug(f'No file found, creating.')
+
+    wb = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        logger.debug(f'-Writing {sheet_name} sheet-')
+        ws = wb.create_sheet(sheet_name)
+        for row in sheet_rows(ws, df):
+            ws.append(row)
+    wb.save(output_file)
+    print()
+
+def main():
+    # set up logging stuff
+    logger = setup_logging(
+        log_filename="convert_policies.log",
+        logger_name="convert_policies",
+        console_level=logging.INFO,
+        file_level=logging.DEBUG
+    )
+
+    sheets = build_sheets(".", logger)
+    write_workbook(sheets, "output.xlsx", logger)
+
+    print("Excel file created and updated successfully.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,699 @@
 import json
+import os
 import subprocess
 import re
 import argparse
 import logging
-
-
-def run_oci_command(command, verbose, logger):
+import time
+import threading
+import random
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from policy_json import iter_json_array
+
+
+# (resource type, list file, output file) for each exported item type
+EXPORT_RESOURCES = [
+    ("security-rule", "security_rule.json", "security_rule_output.json"),
+    ("address-list", "addresslist.json", "addresslist_output.json"),
+    ("service-list", "servicelist.json", "servicelist_output.json"),
+    ("service", "service.json", "service_output.json"),
+    ("application", "application.json", "application_output.json"),
+    ("application-group", "applicationlist.json", "applicationlist_output.json"),
+    ("url-list", "url_list.json", "url_list_output.json"),
+]
+
+# OCI CLI (list, get) command templates for each resource type
+CLI_COMMANDS = {
+    "security-rule": (
+        "oci network-firewall security-rule list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall security-rule get --network-firewall-policy-id {parent_resource_id} --security-rule-name {name} {tokenstring}",
+    ),
+    "address-list": (
+        "oci network-firewall address-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall address-list get --network-firewall-policy-id {parent_resource_id} --address-list-name {name} {tokenstring}",
+    ),
+    "service-list": (
+        "oci network-firewall service-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall service-list get --network-firewall-policy-id {parent_resource_id} --service-list-name {name} {tokenstring}",
+    ),
+    "service": (
+        "oci network-firewall service list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall service get --network-firewall-policy-id {parent_resource_id} --service-name {name} {tokenstring}",
+    ),
+    "application": (
+        "oci network-firewall application list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall application get --network-firewall-policy-id {parent_resource_id} --application-name {name} {tokenstring}",
+    ),
+    "application-group": (
+        "oci network-firewall application-group list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall application-group get --network-firewall-policy-id {parent_resource_id} --application-group-name {name} {tokenstring}",
+    ),
+    "url-list": (
+        "oci network-firewall url-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring}",
+        "oci network-firewall url-list get --network-firewall-policy-id {parent_resource_id} --url-list-name {name}  {tokenstring}",
+    ),
+}
+
+# Fields Convert-Policies.py reads from each resource type; a list summary carrying
+# all of them is as good as the object returned by get
+REQUIRED_FIELDS = {
+    "security-rule": ("name", "condition", "action"),
+    "address-list": ("name", "addresses"),
+    "service-list": ("name", "services"),
+    "service": ("name", "type", "port-ranges"),
+    "application": ("name", "icmp-type"),
+    "application-group": ("name", "apps"),
+    "url-list": ("name", "urls"),
+}
+
+# OCI Python SDK NetworkFirewallClient (list method, get method, get name keyword) for each resource type
+SDK_METHODS = {
+    "security-rule": ("list_security_rules", "get_security_rule", "security_rule_name"),
+    "address-list": ("list_address_lists", "get_address_list", "address_list_name"),
+    "service-list": ("list_service_lists", "get_service_list", "service_list_name"),
+    "service": ("list_services", "get_service", "service_name"),
+    "application": ("list_applications", "get_application", "application_name"),
+    "application-group": ("list_application_groups", "get_application_group", "application_group_name"),
+    "url-list": ("list_url_lists", "get_url_list", "url_list_name"),
+}
+
+# Get calls queued per worker while exporting; list entries are read from the list file only as fast as this allows
+EXPORT_QUEUE_PER_WORKER = 4
+
+
+class OciCommandError(Exception):
     """
-    Runs the given OCI CLI command.
+    Raised when an OCI call fails. `status` is the HTTP status reported by OCI, or
+    None when the request never got a response.
     """
-    subprocess.run(command, shell=True)
-    print()
+    def __init__(self, status, message, transient=False):
+        super().__init__(f"OCI call failed (status {status}): {message}")
+        self.status = status
+        self.transient = transient or status == 429 or (status is not None and status >= 500)
+
 
 def execute_oci_command(command, verbose, logger):
     """
     Executes the given OCI CLI command and captures the output.
+    Raises OciCommandError if the CLI exits with an error.
     """
     output = subprocess.run(command, shell=True, capture_output=True, text=True)
     if verbose:
         logger.debug(f"Verbose - Command: {command}")
-        logger.debug(json.loads(output.stdout))
+        logger.debug(output.stdout)
+    if output.returncode != 0:
+        # The CLI prints the service error as JSON on stderr, including the HTTP status
+        status = re.search(r'"status":\s*(\d+)', output.stderr)
+        network_error = re.search(r'RequestException|timed out|Connection', output.stderr)
+        raise OciCommandError(int(status.group(1)) if status else None, output.stderr.strip(), transient=bool(network_error))
+    # The CLI prints nothing at all for a list call that has no items
+    if not output.stdout.strip():
+        return {"data": {"items": []}}
     return json.loads(output.stdout)
 
-def generate_json_files(network_firewall_policy_id, tokenstring, verbose, logger):
+def to_cli_keys(value):
+    """
+    Recursively renames snake_case keys to the hyphenated keys the OCI CLI prints,
+    so SDK responses produce the same JSON files as the CLI backend.
+    """
+    if isinstance(value, dict):
+        return {key.replace('_', '-'): to_cli_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_cli_keys(item) for item in value]
+    return value
+
+
+def ordered_map(executor, fn, iterable, window):
+    """
+    Like executor.map, but with at most `window` calls queued at a time, so the input
+    is consumed lazily and only a window of results is held. Results are yielded in
+    input order. Calls that have not started are cancelled if the consumer fails.
+    """
+    pending = deque()
+    try:
+        for args in iterable:
+            pending.append(executor.submit(fn, args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class CliBackend:
+    """
+    Transport that spawns one `oci` CLI process per list/get call.
+    """
+    name = "cli"
+
+    def __init__(self, network_firewall_policy_id, tokenstring, verbose, logger):
+        self.network_firewall_policy_id = network_firewall_policy_id
+        self.tokenstring = tokenstring
+        self.verbose = verbose
+        self.logger = logger
+
+    def list_items(self, resource):
+        command = CLI_COMMANDS[resource][0].format(network_firewall_policy_id=self.network_firewall_policy_id, tokenstring=self.tokenstring)
+        self.logger.info(f"Running: {command}.")
+        return execute_oci_command(command, self.verbose, self.logger)
+
+    def get_item(self, resource, name, parent_resource_id):
+        command = CLI_COMMANDS[resource][1].format(parent_resource_id=parent_resource_id, name=name, tokenstring=self.tokenstring)
+        self.logger.info(f"Running: {command}.")
+        return execute_oci_command(command, self.verbose, self.logger)
+
+
+class SdkBackend:
+    """
+    Transport that calls the OCI Python SDK in-process. A single NetworkFirewallClient
+    is shared by every worker, so all calls reuse one pooled HTTPS session instead of
+    paying interpreter start-up and a TLS handshake per item.
+    """
+    name = "sdk"
+
+    def __init__(self, network_firewall_policy_id, token, profile, pool_size, verbose, logger):
+        try:
+            import oci
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            print("The 'sdk' backend needs the OCI Python SDK. Install it with 'pip install oci'. Exiting.")
+            raise SystemExit(1)
+
+        self.oci = oci
+        self.network_firewall_policy_id = network_firewall_policy_id
+        self.verbose = verbose
+        self.logger = logger
+
+        config = oci.config.from_file(profile_name=profile)
+        if token:
+            with open(config['security_token_file'], 'r') as f:
+                security_token = f.read().strip()
+            private_key = oci.signer.load_private_key_from_file(config['key_file'])
+            signer = oci.auth.signers.SecurityTokenSigner(security_token, private_key)
+            self.client = oci.network_firewall.NetworkFirewallClient({'region': config['region']}, signer=signer, retry_strategy=oci.retry.NoneRetryStrategy())
+        else:
+            self.client = oci.network_firewall.NetworkFirewallClient(config, retry_strategy=oci.retry.NoneRetryStrategy())
+
+        # Size the connection pool to the number of workers so no call waits on a socket
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        self.client.base_client.session.mount('https://', adapter)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Calls the SDK and re-raises its errors as OciCommandError so the scheduler can
+        retry them. Retries are left to the scheduler, so the client's own are disabled.
+        """
+        try:
+            return method(*args, **kwargs)
+        except self.oci.exceptions.ServiceError as e:
+            raise OciCommandError(e.status, e.message)
+        except self.oci.exceptions.RequestException as e:
+            raise OciCommandError(None, str(e), transient=True)
+
+    def list_items(self, resource):
+        method = getattr(self.client, SDK_METHODS[resource][0])
+        self.logger.info(f"Listing {resource} items via SDK.")
+        response = self.call(self.oci.pagination.list_call_get_all_results, method, network_firewall_policy_id=self.network_firewall_policy_id)
+        # Collection responses wrap the summaries in an `items` attribute
+        summaries = response.data if isinstance(response.data, list) else response.data.items
+        items = [to_cli_keys(self.oci.util.to_dict(item)) for item in summaries]
+        return {"data": {"items": items}}
+
+    def get_item(self, resource, name, parent_resource_id):
+        _, get_method, name_keyword = SDK_METHODS[resource]
+        self.logger.info(f"Getting {resource} '{name}' via SDK.")
+        response = self.call(getattr(self.client, get_method), network_firewall_policy_id=parent_resource_id, **{name_keyword: name})
+        result = {"data": to_cli_keys(self.oci.util.to_dict(response.data))}
+        if response.headers.get('etag'):
+            result["etag"] = response.headers['etag']
+        if self.verbose:
+            self.logger.debug(result)
+        return result
+
+
+class FakeBackend:
     """
-    Generates JSON files containing information about network firewall policy items.
+    Offline stand-in for OCI that serves a synthetic policy in the same JSON shape
+    as the CLI, with an optional per-call latency. Used to exercise and benchmark
+    the export path without a tenancy. List calls return thin summaries unless
+    `full_list` is set, in which case they carry the complete objects. A fraction
+    `error_rate` of calls fail with a simulated 429 to exercise the retry path.
+    """
+    name = "fake"
+
+    page_size = 100
+
+    def __init__(self, network_firewall_policy_id, rule_count, latency, full_list, logger, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.full_list = full_list
+        self.logger = logger
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+        self.policy = build_fake_policy(network_firewall_policy_id, rule_count)
+        self.index = {(resource, item["name"]): item for resource, items in self.policy.items() for item in items}
+
+    def count_call(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise OciCommandError(429, "TooManyRequests (simulated by the fake backend)")
+
+    def list_items(self, resource):
+        # One round trip per page, like `--all` pagination against the real API
+        for _ in range(max(-(-len(self.policy[resource]) // self.page_size), 1)):
+            self.count_call()
+        if self.full_list:
+            return {"data": {"items": list(self.policy[resource])}}
+        summary_keys = ("name", "parent-resource-id", "type", "action", "priority-order")
+        items = [{key: item[key] for key in summary_keys if key in item} for item in self.policy[resource]]
+        return {"data": {"items": items}}
+
+    def get_item(self, resource, name, parent_resource_id):
+        self.count_call()
+        if (resource, name) not in self.index:
+            raise KeyError(f"{resource} '{name}' not found")
+        return {"data": self.index[(resource, name)]}
+
+
+class RequestScheduler:
+    """
+    Shared gate for every OCI call in the export. It enforces:
+
+    - a token bucket of `rate` calls/second with bursts of up to `burst` calls.
+      The rate is halved on every 429 and creeps back up on success.
+    - a per-resource-type cap on concurrent calls.
+    - optionally, a cap of `total_limit` calls in flight across every resource
+      type and every policy sharing the scheduler.
+    - retries of transient failures (429, 5xx, network errors) with jittered
+      exponential backoff, counted per resource type.
+    """
+    def __init__(self, rate, burst, max_retries, base_delay, max_delay, resource_limits, default_limit, logger, total_limit=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.semaphores = {resource: threading.Semaphore(resource_limits.get(resource, default_limit)) for resource, _, _ in EXPORT_RESOURCES}
+        self.budget = threading.Semaphore(total_limit) if total_limit else nullcontext()
+        self.counters = self.new_counters()
+
+    @staticmethod
+    def new_counters():
+        return {resource: {"calls": 0, "retries": 0, "throttled": 0, "failed": 0} for resource, _, _ in EXPORT_RESOURCES}
+
+    def acquire_token(self):
+        """
+        Blocks until the token bucket allows another call. A rate of None disables the limit.
+        """
+        while self.max_rate:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def record(self, counters, resource, key):
+        with self.lock:
+            counters[resource][key] += 1
+
+    def adjust_rate(self, throttled):
+        """
+        Halves the rate after a 429 and recovers by 5% of the configured rate after each success.
+        """
+        if not self.max_rate:
+            return
+        with self.lock:
+            if throttled:
+                self.rate = max(self.rate / 2, 0.1)
+                self.logger.debug(f"Throttled by OCI, lowering the request rate to {self.rate:.1f}/s.")
+            elif self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def call(self, resource, func, *args, counters=None):
+        """
+        Runs func(*args) under the rate limit and the resource's concurrency cap, retrying transient errors.
+        Calls are counted in `counters`, which defaults to the scheduler's own.
+        """
+        counters = counters or self.counters
+        with self.semaphores[resource]:
+            attempt = 0
+            while True:
+                self.acquire_token()
+                self.record(counters, resource, "calls")
+                try:
+                    # The global budget is only held for the call itself, not during backoff
+                    with self.budget:
+                        result = func(*args)
+                except OciCommandError as e:
+                    if e.status == 429:
+                        self.record(counters, resource, "throttled")
+                        self.adjust_rate(throttled=True)
+                    if not e.transient or attempt >= self.max_retries:
+                        self.record(counters, resource, "failed")
+                        raise
+                    # Full jitter keeps retrying workers from hitting OCI in lockstep
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                    attempt += 1
+                    self.record(counters, resource, "retries")
+                    self.logger.debug(f"Retry {attempt}/{self.max_retries} for {resource} in {delay:.2f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                self.adjust_rate(throttled=False)
+                return result
+
+
+class ScheduledBackend:
     """
-    # Define OCI CLI commands to generate JSON files
-    oci_commands = [
-        "oci network-firewall security-rule list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > security_rule.json",
-        "oci network-firewall address-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > addresslist.json",
-        "oci network-firewall service list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > service.json",
-        "oci network-firewall service-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > servicelist.json",
-        "oci network-firewall application list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > application.json",
-        "oci network-firewall application-group list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > applicationlist.json",
-        "oci network-firewall url-list list --network-firewall-policy-id {network_firewall_policy_id} --all {tokenstring} > url_list.json"
-    ]
+    Wraps a backend so every list/get call goes through the RequestScheduler.
+    With `counters`, the calls are counted there instead of in the scheduler, so
+    several policies can share one scheduler and still be reported separately.
+    """
+    def __init__(self, backend, scheduler, counters=None):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.name = backend.name
+        self.counters = counters or scheduler.counters
+
+    def list_items(self, resource):
+        return self.scheduler.call(resource, self.backend.list_items, resource, counters=self.counters)
 
-    # Replace {network_firewall_policy_id} with actual value
-    for i, command in enumerate(oci_commands):
-        oci_commands[i] = command.format(network_firewall_policy_id=network_firewall_policy_id, tokenstring=tokenstring)
+    def get_item(self, resource, name, parent_resource_id):
+        return self.scheduler.call(resource, self.backend.get_item, resource, name, parent_resource_id, counters=self.counters)
 
 
-    # Run OCI CLI commands to generate JSON files
-    for command in oci_commands:
-        logger.info(f"Running: {command}.")
-        run_oci_command(command, verbose, logger)
+def build_fake_policy(network_firewall_policy_id, rule_count):
+    """
+    Builds a deterministic synthetic policy with `rule_count` security rules and
+    proportionally sized address lists, services, service lists, applications,
+    application groups and URL lists, keyed by resource type.
+    """
+    list_count = max(rule_count // 4, 1)
+    policy = {resource: [] for resource, _, _ in EXPORT_RESOURCES}
+    for i in range(list_count):
+        policy["address-list"].append({
+            "name": f"addr-{i}", "parent-resource-id": network_firewall_policy_id, "type": "IP",
+            "addresses": [f"10.{i // 256 % 256}.{i % 256}.0/24"], "total-addresses": 1,
+        })
+        policy["service"].append({
+            "name": f"svc-{i}", "parent-resource-id": network_firewall_policy_id, "type": "TCP_SERVICE",
+            "port-ranges": [{"minimum-port": 1024 + i % 60000, "maximum-port": 1024 + i % 60000}],
+        })
+        policy["service-list"].append({
+            "name": f"svcgrp-{i}", "parent-resource-id": network_firewall_policy_id,
+            "services": [f"svc-{i}"], "total-services": 1,
+        })
+        policy["url-list"].append({
+            "name": f"urls-{i}", "parent-resource-id": network_firewall_policy_id,
+            "urls": [{"pattern": f"*.site{i}.example.com", "type": "SIMPLE"}], "total-urls": 1,
+        })
+    for i in range(max(list_count // 10, 1)):
+        policy["application"].append({
+            "name": f"icmp-{i}", "parent-resource-id": network_firewall_policy_id, "type": "ICMP",
+            "icmp-type": i % 256, "icmp-code": None,
+        })
+        policy["application-group"].append({
+            "name": f"icmpgrp-{i}", "parent-resource-id": network_firewall_policy_id,
+            "apps": [f"icmp-{i}"], "total-apps": 1,
+        })
+    for i in range(rule_count):
+        policy["security-rule"].append({
+            "name": f"rule-{i}", "parent-resource-id": network_firewall_policy_id,
+            "action": "ALLOW" if i % 5 else "DROP", "priority-order": i,
+            "condition": {
+                "source-address": [f"addr-{i % list_count}"],
+                "destination-address": [f"addr-{(i + 1) % list_count}"],
+                "service": [f"svcgrp-{i % list_count}"],
+                "application": [],
+                "url": [],
+            },
+        })
+    return policy
+
+
+def generate_json_files(backend, logger, workers=1, keep_existing=False, output_dir='.'):
+    """
+    Generates JSON files in output_dir containing information about network firewall policy items.
+    The list calls are independent, so they are fanned out across `workers` threads.
+    With `keep_existing`, list files left by an interrupted run are reused so a resumed
+    export works through the same item set.
+    """
+    def write_list_file(resource_files):
+        resource, list_file = resource_files
+        data = backend.list_items(resource)
+        with open(list_file, 'w') as outfile:
+            json.dump(data, outfile, indent=4)
+
+    # Run the list calls and write one JSON file per resource type
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list_files = [(resource, os.path.join(output_dir, list_file)) for resource, list_file, _ in EXPORT_RESOURCES]
+        list(executor.map(write_list_file, [(resource, list_file) for resource, list_file in list_files if not (keep_existing and os.path.exists(list_file))]))
     print()
 
-def export_items(input_file, output_file, command_template, tokenstring, verbose, logger):
+def has_required_fields(resource, entry):
     """
-    Export items from input JSON file using OCI CLI commands based on the command template.
+    Returns True if a list summary already carries every field Convert-Policies.py reads
+    for this resource type, so the item can be exported without a get call.
     """
-    with open(input_file, 'r') as f:
-        data = json.load(f)
+    return all(field in entry for field in REQUIRED_FIELDS[resource])
+
+def load_journal(journal_file):
+    """
+    Reads the items already fetched by an interrupted run from its append-only journal,
+    keyed by item name. Returns the items and the byte length of the complete lines;
+    a partially written last line lies beyond it and is ignored, as are lines that
+    do not parse (a journal resumed before the tail was cut off can hold one).
+    """
+    journaled = {}
+    complete = 0
+    if not os.path.exists(journal_file):
+        return journaled, complete
+    with open(journal_file, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            journaled[record["name"]] = record["item"]
+    return journaled, complete
+
+def export_items(resource, input_file, output_file, backend, logger, workers=1, list_only=False, journal_file=None, resume=False):
+    """
+    Export items listed in the input JSON file by fetching each one through the backend.
+    The per-item get calls run on a pool of `workers` threads; results are written in
+    the same order as the list output regardless of completion order.
+
+    The list file is streamed entry by entry in a single pass and each result is
+    written as soon as it is next in order, so the items being exported only take
+    the memory of the queue of in-flight calls. The output is written to a temporary
+    file and moved into place once complete.
+
+    With `list_only`, entries whose summary already has the required fields are written
+    as-is and only the rest are fetched with get.
+
+    With `journal_file`, every fetched item is appended to the journal as soon as it
+    arrives. With `resume`, items already in the journal are not fetched again; the
+    journal is loaded into memory whole.
+
+    Returns a dict with the item count, get count and elapsed seconds for throughput reporting.
+    """
+    start = time.monotonic()
 
     logger.info(f"Wait while the items from {input_file} are getting exported...")
     print()
 
-    items = data.get('data', {}).get('items', [])
-    output_data = []
+    journaled = {}
+    if journal_file and resume:
+        journaled, complete = load_journal(journal_file)
+        # Cut off a torn last line, so the records appended below start on a line of their own
+        if os.path.exists(journal_file) and os.path.getsize(journal_file) > complete:
+            os.truncate(journal_file, complete)
 
-    # Loop through each entry in the JSON file
-    for entry in items:
+    def local_item(entry):
+        """Returns the item and where it came from if it can be exported without an OCI call, otherwise (None, None)."""
         name = entry.get('name')
-        parent_resource_id = entry.get('parent-resource-id')
+        if name in journaled:
+            return journaled[name], "resumed"
+        if list_only and has_required_fields(resource, entry):
+            return {"data": entry}, "listed"
+        return None, None
+
+    journal = open(journal_file, 'a' if resume else 'w') if journal_file else None
+    journal_lock = threading.Lock()
+
+    def export_listed(entry):
+        item, source = local_item(entry)
+        if item is not None:
+            return item, source
+        item = backend.get_item(resource, entry.get('name'), entry.get('parent-resource-id'))
+        if journal:
+            with journal_lock:
+                journal.write(json.dumps({"name": entry.get('name'), "item": item}) + "\n")
+                journal.flush()
+        return item, "gets"
+
+    # Written as json.dump would write the whole list, one item at a time
+    counts = {"total": 0, "resumed": 0, "listed": 0, "gets": 0}
+    temp_file = output_file + ".tmp"
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor, open(temp_file, 'w') as outfile:
+            outfile.write('[')
+            # ordered_map yields in submission order, which keeps the output deterministic
+            exported = ordered_map(executor, export_listed, iter_json_array(input_file, 'data', 'items'), workers * EXPORT_QUEUE_PER_WORKER)
+            for index, (item, source) in enumerate(exported):
+                if index:
+                    outfile.write(', ')
+                outfile.write(json.dumps(item))
+                counts["total"] += 1
+                counts[source] += 1
+            outfile.write(']')
+        os.replace(temp_file, output_file)
+    finally:
+        if journal:
+            journal.close()
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    total = counts["total"]
+    if resume:
+        logger.info(f"{counts['resumed']} of {total} {resource} items recovered from {journal_file}.")
+    if list_only:
+        logger.info(f"{counts['listed']} of {total} {resource} items taken from the list response, {counts['gets']} needed a get call.")
 
-        # Construct OCI CLI command
-        command = command_template.format(parent_resource_id=parent_resource_id, name=name, tokenstring=tokenstring)
+    print(f"Export successful for items from {input_file}.")
+    print()
 
-        # Execute OCI CLI command using the helper function
-        logger.info(f"Running: {command}.")
-        output = execute_oci_command(command, verbose, logger)
+    return {"items": total, "gets": counts["gets"], "seconds": time.monotonic() - start}
 
-        # Append output to a list
-        output_data.append(output)
+def report_throughput(stats, counters, logger):
+    """
+    Logs the number of items, elapsed time and items/second for each exported resource type,
+    along with the scheduler's call, retry and throttle counters.
+    """
+    logger.info("Export throughput per resource type:")
+    for resource, result in stats.items():
+        seconds = result["seconds"]
+        rate = result["items"] / seconds if seconds > 0 else 0.0
+        counter = counters[resource]
+        logger.info(f"  {resource:<20} {result['items']:>7} items in {seconds:8.2f}s ({rate:.1f} items/s, {result['gets']} get calls, "
+                    f"{counter['calls']} requests, {counter['retries']} retries, {counter['throttled']} throttled)")
+
+def parse_resource_limits(values):
+    """
+    Parses repeated --resource-limit TYPE=N options into a dict of concurrency caps.
+    """
+    limits = {}
+    for value in values or []:
+        resource, _, limit = value.partition('=')
+        if resource not in SDK_METHODS or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid --resource-limit '{value}'. Expected TYPE=N with TYPE one of {', '.join(SDK_METHODS)}.")
+        limits[resource] = int(limit)
+    return limits
+
+def create_backend(args, network_firewall_policy_id, tokenstring, verbose, logger):
+    """
+    Returns the transport selected with --backend.
+    """
+    if args.backend == "sdk":
+        return SdkBackend(network_firewall_policy_id, args.token, args.profile, args.workers, verbose, logger)
+    if args.backend == "fake":
+        return FakeBackend(network_firewall_policy_id, args.fake_rules, args.fake_latency, args.fake_full_list, logger, args.fake_error_rate)
+    return CliBackend(network_firewall_policy_id, tokenstring, verbose, logger)
 
-    print(f"Export successful for items from {input_file}.")
-    print()
+def export_policy(args, network_firewall_policy_id, tokenstring, verbose, scheduler, logger, output_dir='.'):
+    """
+    Exports one policy's list and output files into output_dir through the shared
+    scheduler, logs its throughput and returns the per-resource stats.
+    """
+    workers = args.workers
+    transport = create_backend(args, network_firewall_policy_id, tokenstring, verbose, logger)
+    backend = ScheduledBackend(transport, scheduler, RequestScheduler.new_counters())
+    logger.info(f"Using the {backend.name} backend with {workers} worker(s) for {network_firewall_policy_id}.")
+
+    # Generate JSON files
+    generate_json_files(backend, logger, workers, args.resume, output_dir)
+
+    # Run export functions
+    stats = {}
+    for resource, input_file, output_file in EXPORT_RESOURCES:
+        input_file, output_file = os.path.join(output_dir, input_file), os.path.join(output_dir, output_file)
+        journal_file = output_file + ".journal"
+        stats[resource] = export_items(resource, input_file, output_file, backend, logger, workers, args.list_only, journal_file, args.resume)
+    report_throughput(stats, backend.counters, logger)
+
+    # Every output file is complete, so the journals are no longer needed
+    for _, _, output_file in EXPORT_RESOURCES:
+        os.remove(os.path.join(output_dir, output_file) + ".journal")
+    if backend.name == "fake":
+        logger.info(f"Fake backend served {transport.calls} calls.")
+    return stats
+
+def read_policy_ids(args):
+    """
+    Returns the policy OCIDs given with --policy-id and in --policy-file (one per
+    line, blank lines and '#' comments skipped), without duplicates.
+    """
+    policy_ids = list(args.policy_id or [])
+    if args.policy_file:
+        with open(args.policy_file, 'r') as f:
+            policy_ids.extend(line.strip() for line in f if line.strip() and not line.strip().startswith('#'))
+    return list(dict.fromkeys(policy_ids))
 
-    # Save output to a JSON file
-    with open(output_file, 'w') as outfile:
-        json.dump(output_data, outfile)
+def export_policies(args, policy_ids, tokenstring, verbose, logger):
+    """
+    Exports several policies concurrently, each into <output dir>/<policy OCID>.
+    Up to --parallel-policies policies run at once, and every OCI call goes through
+    one shared scheduler, so --budget (calls in flight) and --rate hold across all
+    of them. A failed policy is logged and the others carry on; the run ends with a
+    summary of every policy.
+    """
+    scheduler = RequestScheduler(args.rate, args.burst, args.max_retries, 0.5, 30.0, parse_resource_limits(args.resource_limit), args.budget, logger, args.budget)
+    output_dir = args.output_dir or "exports"
+    logger.info(f"Exporting {len(policy_ids)} policies into {output_dir}, {args.parallel_policies} at a time with at most {args.budget} OCI calls in flight.")
+
+    def export_one(network_firewall_policy_id):
+        start = time.monotonic()
+        policy_dir = os.path.join(output_dir, network_firewall_policy_id)
+        try:
+            os.makedirs(policy_dir, exist_ok=True)
+            stats = export_policy(args, network_firewall_policy_id, tokenstring, verbose, scheduler, logger, policy_dir)
+            return "ok", sum(result["items"] for result in stats.values()), time.monotonic() - start
+        except Exception as e:
+            logger.exception(f"Export of {network_firewall_policy_id} failed: {e}")
+            return "failed", 0, time.monotonic() - start
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.parallel_policies) as executor:
+        results = list(executor.map(export_one, policy_ids))
+
+    logger.info("Export summary per policy:")
+    for network_firewall_policy_id, (status, items, seconds) in zip(policy_ids, results):
+        logger.info(f"  {status:<6} {network_firewall_policy_id} {items:>8} items in {seconds:8.2f}s")
+    failed = sum(1 for status, _, _ in results if status != "ok")
+    logger.info(f"{len(policy_ids) - failed} exported, {failed} failed in {time.monotonic() - start:.2f}s.")
 
 
 def setup_logging(log_filename, logger_name, console_level, file_level):
     """
     setup_logging
+
     
     Takes in
     log_filename
@@ -122,6 +729,24 @@ def parse_arguments(logger):
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--token', action='store_true', help='./%(prog)s -t')
     parser.add_argument('-v', '--verbose', action='store_true', help='./%(prog)s -v')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of concurrent OCI calls (default: 1)')
+    parser.add_argument('-b', '--backend', choices=['cli', 'sdk', 'fake'], default='cli', help='How to talk to OCI: spawn the oci CLI, use the Python SDK in-process, or serve a synthetic offline policy (default: cli)')
+    parser.add_argument('--profile', default='DEFAULT', help='OCI config profile used by the sdk backend (default: DEFAULT)')
+    parser.add_argument('--fake-rules', type=int, default=1000, help='Number of security rules served by the fake backend (default: 1000)')
+    parser.add_argument('--fake-latency', type=float, default=0.0, help='Seconds of simulated latency per fake backend call (default: 0)')
+    parser.add_argument('--fake-error-rate', type=float, default=0.0, help='Fraction of fake backend calls that fail with a simulated 429 (default: 0)')
+    parser.add_argument('--fake-full-list', action='store_true', help='Make the fake backend return complete objects from list calls')
+    parser.add_argument('-r', '--resume', action='store_true', help='Continue an interrupted export, reusing its list files and the items already saved in the *_output.json.journal files')
+    parser.add_argument('--rate', type=float, default=None, help='Maximum OCI requests per second across all workers (default: no limit)')
+    parser.add_argument('--burst', type=int, default=10, help='Requests allowed in a burst above --rate (default: 10)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for throttled (429), 5xx and network failures (default: 5)')
+    parser.add_argument('--resource-limit', action='append', metavar='TYPE=N', help='Cap concurrent calls for one resource type, e.g. url-list=2 (repeatable)')
+    parser.add_argument('-l', '--list-only', action='store_true', help='Build the output files from the list responses and only call get for items whose summary lacks required fields. OCI summaries carry no etag or time-updated, so this is the only way to skip get calls')
+    parser.add_argument('-p', '--policy-id', action='append', help='Export this policy without prompting (repeatable); each policy is written to its own directory under --output-dir')
+    parser.add_argument('--policy-file', help='File with one policy OCID per line to export without prompting')
+    parser.add_argument('-o', '--output-dir', default=None, help='Directory for the per-policy directories of --policy-id/--policy-file exports (default: exports)')
+    parser.add_argument('--parallel-policies', type=int, default=4, help='Number of policies exported at the same time (default: 4)')
+    parser.add_argument('--budget', type=int, default=None, help='Maximum OCI calls in flight across all policies being exported (default: --workers)')
     parser.set_defaults(verbose=False)
     parser.set_defaults(token=False)
     args = parser.parse_args()
@@ -151,8 +776,27 @@ def main():
         if args.verbose:
             verbose = True
 
+        workers = args.workers
+        if workers < 1:
+            print("--workers must be at least 1. Exiting.")
+            return
+
         logger.info(f"STARTING EXPORT-POLICIES.PY")
 
+        if args.policy_id or args.policy_file:
+            policy_ids = read_policy_ids(args)
+            invalid = [policy_id for policy_id in policy_ids if not re.match(r'^ocid1\.networkfirewallpolicy\.oc1\..*$', policy_id)]
+            if invalid or not policy_ids:
+                print(f"Invalid Network Firewall Policy ID(s): {', '.join(invalid) or 'none given'}. They should start with 'ocid1.networkfirewallpolicy.oc1.'. Exiting.")
+                return
+            if args.parallel_policies < 1:
+                print("--parallel-policies must be at least 1. Exiting.")
+                return
+            args.budget = args.budget or workers
+            export_policies(args, policy_ids, tokenstring, verbose, logger)
+            logger.info(f"FINISHED EXPORT-POLICIES.PY")
+            return
+
         print("Please provide the Network Firewall Policy ID:")
         network_firewall_policy_id = input().strip()
         print()
@@ -162,17 +806,8 @@ def main():
             print("Invalid Network Firewall Policy ID. It should start with 'ocid1.networkfirewallpolicy.oc1.'. Exiting.")
             return
 
-        # Generate JSON files
-        generate_json_files(network_firewall_policy_id, tokenstring, verbose, logger)
-
-        # Run export functions
-        export_items('security_rule.json', 'security_rule_output.json', 'oci network-firewall security-rule get --network-firewall-policy-id {parent_resource_id} --security-rule-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('addresslist.json', 'addresslist_output.json', 'oci network-firewall address-list get --network-firewall-policy-id {parent_resource_id} --address-list-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('servicelist.json', 'servicelist_output.json', 'oci network-firewall service-list get --network-firewall-policy-id {parent_resource_id} --service-list-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('service.json', 'service_output.json', 'oci network-firewall service get --network-firewall-policy-id {parent_resource_id} --service-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('application.json', 'application_output.json', 'oci network-firewall application get --network-firewall-policy-id {parent_resource_id} --application-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('applicationlist.json', 'applicationlist_output.json', 'oci network-firewall application-group get --network-firewall-policy-id {parent_resource_id} --application-group-name {name} {tokenstring}', tokenstring, verbose, logger)
-        export_items('url_list.json', 'url_list_output.json', 'oci network-firewall url-list get --network-firewall-policy-id {parent_resource_id} --url-list-name {name}  {tokenstring}', tokenstring, verbose, logger)
+        scheduler = RequestScheduler(args.rate, args.burst, args.max_retries, 0.5, 30.0, parse_resource_limits(args.resource_limit), workers, logger)
+        export_policy(args, network_firewall_policy_id, tokenstring, verbose, scheduler, logger)
 
         logger.info(f"FINISHED EXPORT-POLICIES.PY")
     except SystemExit:
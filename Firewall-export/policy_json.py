@@ -0,0 +1,87 @@
+"""
+Streaming reader for the large JSON files written by the OCI CLI and by
+Export-Policies.py. Standard library only, so Export-Policies.py can use it
+without pandas.
+"""
+import json
+
+# Characters read at a time when streaming JSON files
+JSON_CHUNK_SIZE = 1 << 16
+
+def iter_json_array(file_path, *keys):
+    """
+    Yield the elements of a JSON array one at a time, reading the file in chunks so
+    only the current element is held in memory. `keys` is the path of object keys
+    leading to the array, e.g. ('data', 'items') for an OCI list response; with no
+    keys the file itself must be an array. A missing key yields nothing, like
+    .get(key, {}) would.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    with open(file_path, 'r') as f:
+        def fill():
+            # Drop what has been consumed and read at least as much again as is buffered,
+            # so an element spanning many chunks is still decoded in linear time
+            nonlocal buffer, pos, eof
+            chunk = f.read(max(JSON_CHUNK_SIZE, len(buffer) - pos))
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return not eof
+
+        def peek():
+            # Skip whitespace and return the next character, or '' at the end of the file
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not fill():
+                    return ''
+
+        def expect(char):
+            nonlocal pos
+            if peek() != char:
+                raise json.JSONDecodeError(f"Expecting '{char}'", buffer, pos)
+            pos += 1
+
+        def decode_value():
+            # A number cut off by the end of the buffer still decodes ("1." as 1), so a value
+            # only counts once the character after it, which must be a delimiter, has been read
+            nonlocal pos
+            peek()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    if eof or (end < len(buffer) and buffer[end] in ',:]} \t\r\n'):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        for key in keys:
+            expect('{')
+            while True:
+                if peek() == '}':
+                    return
+                name = decode_value()
+                expect(':')
+                if name == key:
+                    break
+                decode_value()
+                if peek() == ',':
+                    pos += 1
+        expect('[')
+        if peek() == ']':
+            return
+        while True:
+            yield decode_value()
+            if peek() == ']':
+                return
+            expect(',')
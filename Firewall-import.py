@@ -1,261 +1,984 @@
 import argparse
+import os
 import pandas as pd
 import json
 import sys
 import logging
+import time
+import ipaddress
+from concurrent.futures import ProcessPoolExecutor
+from script_loader import load_script
 
-def write_json_to_file(data, filename, logger):
-    """Write JSON data to a file."""
+# Sheets read from the input workbook
+WORKBOOK_SHEETS = ['security-rules', 'iplist', 'service', 'url_lists']
+
+# Workbook readers selectable with --reader
+READERS = ['openpyxl', 'calamine', 'read-only-stream']
+
+# Oldest pandas whose read_excel supports engine='calamine'
+CALAMINE_PANDAS_VERSION = (2, 2)
+
+# JSON layouts selectable with --output-format
+OUTPUT_FORMATS = ['indent', 'compact', 'jsonl']
+
+# Convert-Policies.py builds the workbook sheets from Export-Policies.py output; --export-dir reuses it
+CONVERT_POLICIES_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Firewall-export', 'Convert-Policies.py')
+
+# Firewall-diff.py normalises and compares policy snapshots; --plan reuses it
+FIREWALL_DIFF_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Firewall-diff.py')
+
+# Object kinds in the order a --plan creates and updates them, so everything a list or rule
+# refers to exists first; deletes run in the reverse order, once nothing refers to them
+PLAN_ORDER = ['address_lists', 'services', 'applications', 'url_lists', 'service_lists', 'application_lists', 'rules']
+
+# Service optimisation passes selectable with --optimise-services
+SERVICE_OPTIMISATIONS = ['merge', 'rewrite']
+
+# Security rules converted per chunk when streaming, bounding the per-column lists held at once
+RULE_CHUNK_SIZE = 10000
+
+def output_filename(filename, output_format):
+    """JSON-Lines outputs get a .jsonl extension so they are not mistaken for JSON arrays."""
+    if output_format == 'jsonl' and filename.endswith('.json'):
+        return filename[:-len('.json')] + '.jsonl'
+    return filename
+
+def write_json_to_file(data, filename, logger, output_format='indent'):
+    """
+    Write JSON data to a file one object at a time, so `data` can be any iterable,
+    including a generator, and never has to be held in memory as a whole.
+
+    'indent' writes the same bytes as json.dump(list(data), indent=4), 'compact'
+    writes a JSON array without whitespace and 'jsonl' writes one object per line.
+
+    The file is written under a temporary name and renamed into place once complete,
+    so a failed or concurrent run never leaves a partially written output behind.
+    """
+    output_file = output_filename(filename, output_format)
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
     try:
-        with open(filename, 'w') as json_file:
-            json.dump(data, json_file, indent=4)
+        with open(temp_file, 'w') as json_file:
+            write_json_items(json_file, data, output_format)
+        os.replace(temp_file, output_file)
     except IOError as e:
         print(f"Error writing to file: {e}")
         sys.exit(1)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
-def excel_to_json_iplist(excel_file, logger):
-    """Convert Excel sheet 'iplist' to JSON."""
+def write_json_items(json_file, data, output_format):
+    """Write the objects in `data` to an open file in the given output format."""
+    if output_format == 'jsonl':
+        for item in data:
+            json_file.write(json.dumps(item))
+            json_file.write("\n")
+        return
+    if output_format == 'compact':
+        opening, separator, closing, dumps = "[", ",", "]", lambda item: json.dumps(item, separators=(',', ':'))
+    else:
+        opening, separator, closing, dumps = "[\n    ", ",\n    ", "\n]", lambda item: json.dumps(item, indent=4).replace("\n", "\n    ")
+    written = False
+    for item in data:
+        json_file.write(separator if written else opening)
+        json_file.write(dumps(item))
+        written = True
+    json_file.write(closing if written else "[]")
+
+def stream_workbook_sheets(excel_file, logger, sheet_names=WORKBOOK_SHEETS):
+    """
+    Read the converters' sheets row by row from an openpyxl read-only workbook.
+    Only one row is held at a time, and it is appended straight into per-column
+    lists for the named columns. Unnamed padding columns are never stored, and
+    the raw cell data is never held in memory all at once.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(excel_file, sheet_name='iplist')
+        sheets = {}
+        for name in sheet_names:
+            if name not in workbook.sheetnames:
+                continue
+            rows = workbook[name].iter_rows(values_only=True)
+            header = next(rows, ())
+            named = [(position, column) for position, column in enumerate(header) if column is not None]
+            columns = {column: [] for _, column in named}
+            pending_blank_rows = 0
+            for row in rows:
+                # Blank rows only count if data follows them, matching pandas' trimming of trailing blanks
+                if all(value is None for value in row):
+                    pending_blank_rows += 1
+                    continue
+                for _ in range(pending_blank_rows):
+                    for column in columns.values():
+                        column.append(None)
+                pending_blank_rows = 0
+                for position, column in named:
+                    columns[column].append(row[position] if position < len(row) else None)
+            logger.debug(f"Streamed {len(next(iter(columns.values()), []))} rows from sheet '{name}'")
+            sheets[name] = pd.DataFrame(columns).fillna(float('nan'))
+        return sheets
+    finally:
+        workbook.close()
+
+def check_reader(reader):
+    """
+    Exit with an explanation if `reader` cannot run here. The 'calamine' engine
+    needs python-calamine and pandas 2.2 or later, while Requirements.txt pins
+    an older pandas.
+    """
+    if reader != 'calamine':
+        return
+    version = tuple(int(part) if part.isdigit() else 0 for part in pd.__version__.split('.')[:2])
+    if version < CALAMINE_PANDAS_VERSION:
+        print(f"The 'calamine' reader needs pandas {'.'.join(map(str, CALAMINE_PANDAS_VERSION))} or later, but pandas {pd.__version__} is installed. "
+              "Upgrade it with 'pip install \"pandas>=2.2\" python-calamine' or use another --reader.")
+        sys.exit(1)
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        print("The 'calamine' reader needs python-calamine. Install it with 'pip install python-calamine'.")
+        sys.exit(1)
+
+def load_workbook_sheets(excel_file, logger, reader='openpyxl', sheet_names=WORKBOOK_SHEETS):
+    """
+    Open the workbook once and parse every sheet in `sheet_names` (by default all
+    the sheets the converters need). Sheets missing from the workbook are left out
+    of the returned dict.
+
+    `reader` selects the backend: 'openpyxl' (pandas' default engine), 'calamine'
+    (the Rust-based python-calamine engine, much faster on large sheets) or
+    'read-only-stream' (row-by-row streaming, lowest memory).
+    """
+    try:
+        if reader == 'read-only-stream':
+            return stream_workbook_sheets(excel_file, logger, sheet_names)
+        check_reader(reader)
+        with pd.ExcelFile(excel_file, engine=reader) as workbook:
+            return {name: workbook.parse(name) for name in sheet_names if name in workbook.sheet_names}
     except FileNotFoundError:
         print(f"File '{excel_file}' not found.")
         sys.exit(1)
     except Exception as e:
         print(f"Error reading Excel file: {e}")
         sys.exit(1)
-    
-    json_list = []
-    for index, row in df.iterrows():
-        name = row['name']
-        addresses = [address.strip() for address in str(row['addresses']).split(',') if address.strip()]
-        json_obj = {"name": name, "type": "IP", "addresses": addresses}
-        json_list.append(json_obj)
-    
-    write_json_to_file(json_list, 'iplist.json', logger)
 
+def load_export_sheets(export_dir, logger):
+    """
+    Build the workbook sheets straight from the *_output.json files written by
+    Export-Policies.py, using the same field mappings as Convert-Policies.py, so
+    no spreadsheet is written or parsed.
+
+    Blank cells are dropped when a workbook is saved and read back as NaN, so
+    empty strings are replaced with NaN to give the converters the same input.
+    """
+    try:
+        convert_policies = load_script(CONVERT_POLICIES_SCRIPT)
+        sheets = convert_policies.build_sheets(export_dir, logger)
+    except FileNotFoundError as e:
+        print(f"Export file '{e.filename}' not found.")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error reading export files: {e}")
+        sys.exit(1)
+    return {sheet_name: df.replace('', float('nan')) for sheet_name, df in sheets.items()}
+
+def get_sheet(sheets, sheet_name):
+    """Return a parsed sheet, exiting with an error if the workbook does not have it."""
+    if sheet_name not in sheets:
+        print(f"Error reading Excel file: Worksheet named '{sheet_name}' not found")
+        sys.exit(1)
+    return sheets[sheet_name]
+
+def excel_to_json_iplist(sheets, logger, symbols=None):
+    """Convert Excel sheet 'iplist' to JSON."""
+    df = get_sheet(sheets, 'iplist')
+
+    def iter_iplist():
+        for name, addresses in zip(df['name'].tolist(), df['addresses'].tolist()):
+            addresses = [address.strip() for address in str(addresses).split(',') if address.strip()]
+            yield {"name": name, "type": "IP", "addresses": addresses}
+
+    return {'iplist.json': iter_iplist()}
+
+def aggregate_addresses(addresses):
+    """
+    Return the minimal list of CIDRs covering `addresses`. Entries are parsed as
+    networks (host bits are cleared, so 10.0.0.5/24 becomes 10.0.0.0/24), turned
+    into integer ranges and merged in one sorted pass, which removes duplicates and
+    overlaps and joins adjacent prefixes; each merged range is then split back into
+    CIDRs. IPv4 prefixes come first, then IPv6, both in address order; single hosts
+    are written without a prefix length. Entries that are not addresses are kept as given.
+    """
+    ranges = {4: [], 6: []}
+    others = []
+    for address in dict.fromkeys(addresses):
+        try:
+            network = ipaddress.ip_network(address, strict=False)
+        except ValueError:
+            others.append(address)
+            continue
+        ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+    aggregated = []
+    for version, address_class in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+        merged = []
+        for first, last in sorted(ranges[version]):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        for first, last in merged:
+            for network in ipaddress.summarize_address_range(address_class(first), address_class(last)):
+                aggregated.append(str(network.network_address) if network.prefixlen == network.max_prefixlen else str(network))
+    return aggregated + others
+
+def aggregate_iplists(iplists, logger):
+    """
+    Normalisation stage for 'iplist.json': collapse every list's addresses with
+    aggregate_addresses, logging the before/after entry count of each list that
+    shrank and the totals once all lists have been written.
+    """
+    before_total = after_total = changed = 0
+    for iplist in iplists:
+        before = len(iplist["addresses"])
+        iplist["addresses"] = aggregate_addresses(iplist["addresses"])
+        after = len(iplist["addresses"])
+        before_total, after_total = before_total + before, after_total + after
+        if after != before:
+            changed += 1
+            logger.info(f"Address list {iplist['name']}: {before} -> {after} entries")
+        else:
+            logger.debug(f"Address list {iplist['name']}: {before} entries, already minimal")
+        yield iplist
+    logger.info(f"CIDR aggregation: {changed} address lists reduced, {before_total} -> {after_total} entries in total")
+
+
+def excel_to_json_url_lists(sheets, logger, symbols=None):
+    """
+    Convert Excel sheet 'url_lists' to JSON.
 
-def excel_to_json_url_lists(excel_file, logger):
-    """Convert Excel sheet 'url_lists' to JSON."""
+    All lists are built in one pass over the sheet, grouping patterns by list name
+    in the order each name first appears. The lists are registered in `symbols`.
+    """
     try:
-        df = pd.read_excel(excel_file, sheet_name='url_lists')
+        df = get_sheet(sheets, 'url_lists')
         # Make sure the column names are correct
         expected_columns = ['name', 'pattern']
         if not all(col in df.columns for col in expected_columns):
             raise ValueError(f"Expected columns {expected_columns} not found in the DataFrame. Found columns: {df.columns}")
-        #else:
-            #print('columns present')
-        
-        json_list = []
-        # Iterate over the unique names
-        for name in df['name'].unique():
-            #print(name)
-            # Filter the DataFrame by the current name
-            filtered_df = df[df['name'] == name]
-            
-            # Create the 'urls' list
-            urls = [{"pattern": pattern, "type": "SIMPLE"} for pattern in filtered_df['pattern']]
-
-            # Create the data dictionary for the current name
-            data_dict = {
-                "data": {
-                    "name": name,
-                    "urls": urls
-                }
-            }
-            json_list.append(data_dict)
-        write_json_to_file(json_list, 'url_lists.json', logger)
 
-    except FileNotFoundError:
-        print(f"File '{excel_file}' not found.")
-        sys.exit(1)
+        # Dicts keep insertion order, so the lists come out in first-seen order
+        url_lists = {}
+        unnamed = None
+        for name, pattern in zip(df['name'].tolist(), df['pattern'].tolist()):
+            if pd.isna(name):
+                # Rows without a name still produce one empty list, as filtering on NaN matched nothing
+                if unnamed is None:
+                    unnamed = name
+                    url_lists[None] = {"name": name, "urls": []}
+                continue
+            if name not in url_lists:
+                url_lists[name] = {"name": name, "urls": []}
+            url_lists[name]["urls"].append({"pattern": pattern, "type": "SIMPLE"})
+
+        if symbols is not None:
+            for name, data in url_lists.items():
+                if name is not None:
+                    symbols.url_lists[str(name).strip()] = [url["pattern"] for url in data["urls"]]
+            symbols.sheets.add('url_lists')
+        return {'url_lists.json': ({"data": data} for data in url_lists.values())}
+
     except Exception as e:
         print(f"Error reading Excel file: {e}")
         sys.exit(1)
-    
-def excel_to_json_service_list(excel_file, logger):
+
+class SymbolTable:
+    """
+    Name index over the objects a policy defines: address lists, services, service
+    lists, applications, application lists and URL lists. Each is a dict keyed by
+    the stripped object name, so membership checks and group expansion cost O(1)
+    per lookup instead of a scan of the sheet.
+    """
+    def __init__(self):
+        self.address_lists = {}
+        self.services = {}
+        self.service_lists = {}
+        self.applications = {}
+        self.application_lists = {}
+        self.url_lists = {}
+        # The workbook sheets indexed so far
+        self.sheets = set()
+
+    def has_service(self, name):
+        return name in self.services
+
+    def has_application(self, name):
+        return name in self.applications
+
+    def expand_service_list(self, name):
+        """Return the service objects a service list refers to."""
+        return [self.services[service] for service in self.service_lists.get(name, []) if service in self.services]
+
+    def expand_application_list(self, name):
+        """Return the application objects an application list refers to."""
+        return [self.applications[app] for app in self.application_lists.get(name, []) if app in self.applications]
+
+def sheet_columns(df, columns):
+    """Return the given columns as parallel lists, using NaN for columns the sheet lacks."""
+    return [df[column].tolist() if column in df.columns else [float('nan')] * len(df) for column in columns]
+
+def build_symbol_table(sheets, logger, symbols=None):
+    """
+    Index the named objects of every loaded sheet that `symbols` does not cover
+    yet, in one pass per sheet. Sheets a converter already registered while
+    converting them are not read again.
     """
-    Convert Excel sheet 'service' to JSON and write to 'services.json',
-    and create 'servicelist.json' based on service types.
+    if symbols is None:
+        symbols = SymbolTable()
+    if 'iplist' in sheets and 'iplist' not in symbols.sheets:
+        for name, addresses in zip(*sheet_columns(sheets['iplist'], ['name', 'addresses'])):
+            symbols.address_lists[str(name).strip()] = [address.strip() for address in str(addresses).split(',') if address.strip()]
+        symbols.sheets.add('iplist')
+    if 'url_lists' in sheets and 'url_lists' not in symbols.sheets:
+        for name, pattern in zip(*sheet_columns(sheets['url_lists'], ['name', 'pattern'])):
+            symbols.url_lists.setdefault(str(name).strip(), []).append(pattern)
+        symbols.sheets.add('url_lists')
+    if 'service' in sheets and 'service' not in symbols.sheets:
+        excel_to_json_service_list(sheets, logger, symbols)
+    return symbols
+
+def parse_port_ranges(name, minimum_port, maximum_port, logger):
+    """
+    Return the portRanges of a TCP/UDP service row. A single port range may be
+    numbers or blank (None bounds); several ranges are comma-separated lists of
+    equal length, as Convert-Policies.py writes them for multi-range services.
+    """
+    if not isinstance(minimum_port, str) and not isinstance(maximum_port, str):
+        # Check if 'minimumPort' and 'maximumPort' are NaN, if so, set them to None
+        min_port = int(minimum_port) if not pd.isna(minimum_port) else None
+        max_port = int(maximum_port) if not pd.isna(maximum_port) else None
+        return [{"minimumPort": min_port, "maximumPort": max_port}]
+    min_ports = [port.strip() for port in str(minimum_port).split(',')]
+    max_ports = [port.strip() for port in str(maximum_port).split(',')]
+    if len(min_ports) != len(max_ports):
+        logger.error(f"Port count mismatch for service '{name}': min={min_ports}, max={max_ports}")
+        return []
+    port_ranges = []
+    for min_port, max_port in zip(min_ports, max_ports):
+        try:
+            port_ranges.append({"minimumPort": int(min_port), "maximumPort": int(max_port)})
+        except ValueError:
+            logger.error(f"Invalid port number in service '{name}': {min_port}-{max_port}")
+    return port_ranges
+
+def excel_to_json_service_list(sheets, logger, symbols=None):
+    """
+    Convert Excel sheet 'service' to JSON for 'service_input.json',
+    and create 'service_list_input.json' based on service types.
+
+    The sheet is read in a single pass that also registers every service and
+    application in `symbols`; SERVICE_GROUP and ICMP_GROUP members are then
+    validated against that index once the whole sheet has been seen, so groups
+    may refer to objects defined further down.
 
     Parameters:
-    excel_file (str): Path to the Excel file.
+    sheets (dict): Parsed workbook sheets.
+    symbols (SymbolTable): Optional table to register the sheet's objects in.
 
     Returns:
-    None
+    dict: Output filename to list of JSON objects.
     """
     # Read data from 'service' sheet
-    df = pd.read_excel(excel_file, sheet_name='service')
+    df = get_sheet(sheets, 'service')
+    if symbols is None:
+        symbols = SymbolTable()
     json_list_service = []
     json_list_servicelist = []
     json_list_application = []
     json_list_applicationlist = []
 
+    # SERVICE_GROUP and ICMP_GROUP objects whose members are checked after the pass, with the raw member cell
+    service_groups = []
+    application_groups = []
 
-    #builds a list of all services to later check that service lists contain valid services.
-    service_items_list = []
-    for index, row in df.iterrows():
-        name = row['name']
-        service_type = row['type']
-        if service_type in ["TCP_SERVICE", "UDP_SERVICE"]:
-            service_items_list.append(name)        
-
-
-    for index, row in df.iterrows():
-        name = row['name']
-        service_type = row['type']
-        
-        # Check if 'minimumPort' and 'maximumPort' are NaN, if so, set them to None
-        min_port = int(row['minimumPort']) if not pd.isna(row['minimumPort']) else None
-        max_port = int(row['maximumPort']) if not pd.isna(row['maximumPort']) else None
-        icmp_type = int(row['icmpType']) if not pd.isna(row['icmpType']) else None
-
-        # Prepare JSON object for services.json
-        json_obj_service = {"name": name, "type": service_type, "portRanges": [{"minimumPort": min_port, "maximumPort": max_port}]}
-
-        # Append to services.json if service_type is TCP_SERVICE or UDP_SERVICE
+    columns = sheet_columns(df, ['name', 'type', 'minimumPort', 'maximumPort', 'icmpType', 'services'])
+    for name, service_type, minimum_port, maximum_port, icmp_type, services in zip(*columns):
         if service_type in ["TCP_SERVICE", "UDP_SERVICE"]:
+            json_obj_service = {"name": name, "type": service_type, "portRanges": parse_port_ranges(name, minimum_port, maximum_port, logger)}
             json_list_service.append(json_obj_service)
-        
-        # Initialize JSON object for servicelist.json and applicationlist.json
-        json_obj_servicelist = None
-        json_obj_applicationlist = None
+            symbols.services[str(name).strip()] = json_obj_service
 
-        # If service_type is TCP_SERVICE or UDP_SERVICE, create JSON object for servicelist.json
-        if service_type == "TCP_SERVICE" or service_type == "UDP_SERVICE":
             json_obj_servicelist = {"name": name, "services": [name]}
+            json_list_servicelist.append(json_obj_servicelist)
+            symbols.service_lists[str(name).strip()] = json_obj_servicelist["services"]
         elif service_type == "SERVICE_GROUP":
-            services = row['services']  # Assuming 'services' is a column in your Excel sheet
             if isinstance(services, str) and services.strip():  # Check if 'services' is non-empty string
-                matching_list = []
-                for service in services.split(','):
-                    if service in service_items_list:
-                        matching_list.append(service.strip())
-                    else:
-                        logger.debug(f'Error: {name} : {service} - service not in available services.')
-
-                json_obj_servicelist = {"name": name, "services":[matched_service.strip() for matched_service in matching_list]}
-
-        # Append non-empty JSON objects to the list
-        if json_obj_servicelist is not None:
-            json_list_servicelist.append(json_obj_servicelist)
-
-        # Prepare JSON object for application.json
-        if service_type in ["ICMP_TYPE"]:
+                json_obj_servicelist = {"name": name, "services": []}
+                json_list_servicelist.append(json_obj_servicelist)
+                service_groups.append((json_obj_servicelist, services))
+        elif service_type == "ICMP_TYPE":
+            icmp_type = int(icmp_type) if not pd.isna(icmp_type) else None
             json_obj_application = {"name": name, "type": "ICMP", "icmpType": icmp_type, "icmpCode": None}
             json_list_application.append(json_obj_application)
+            symbols.applications[str(name).strip()] = json_obj_application
 
-        # If service_type is ICMP_TYPE , create JSON object for applicationlist.json
-        if service_type == "ICMP_TYPE":
             json_obj_applicationlist = {"name": name, "apps": [name]}
+            json_list_applicationlist.append(json_obj_applicationlist)
+            symbols.application_lists[str(name).strip()] = json_obj_applicationlist["apps"]
         elif service_type == "ICMP_GROUP":
-            services = row['services']
             if isinstance(services, str) and services.strip():  # Check if 'services' is non-empty string
-                json_obj_applicationlist = {"name": name, "apps":[service.strip() for service in services.split(',')]}
+                json_obj_applicationlist = {"name": name, "apps": []}
+                json_list_applicationlist.append(json_obj_applicationlist)
+                application_groups.append((json_obj_applicationlist, services))
 
-        # Append non-empty JSON objects to the list
-        if json_obj_applicationlist is not None:
-            json_list_applicationlist.append(json_obj_applicationlist)
+    # Every service is indexed now, so each member check is a dict lookup
+    for json_obj_servicelist, services in service_groups:
+        for service in services.split(','):
+            service = service.strip()
+            if symbols.has_service(service):
+                json_obj_servicelist["services"].append(service)
+            else:
+                logger.debug(f'Error: {json_obj_servicelist["name"]} : {service} - service not in available services.')
+        symbols.service_lists[str(json_obj_servicelist["name"]).strip()] = json_obj_servicelist["services"]
+    for json_obj_applicationlist, services in application_groups:
+        for service in services.split(','):
+            service = service.strip()
+            if symbols.has_application(service):
+                json_obj_applicationlist["apps"].append(service)
+            else:
+                logger.debug(f'Error: {json_obj_applicationlist["name"]} : {service} - application not in available applications.')
+        symbols.application_lists[str(json_obj_applicationlist["name"]).strip()] = json_obj_applicationlist["apps"]
+    symbols.sheets.add('service')
+
+    return {
+        'service_input.json': json_list_service,
+        'service_list_input.json': json_list_servicelist,
+        'application_input.json': json_list_application,
+        'application_list_input.json': json_list_applicationlist,
+    }
+
+def merge_port_ranges(port_ranges):
+    """
+    Sort a service's port ranges and merge the overlapping or adjacent ones.
+    Ranges with a missing bound are left as they are.
+    """
+    if any(port_range["minimumPort"] is None or port_range["maximumPort"] is None for port_range in port_ranges):
+        return port_ranges
+    merged = []
+    for port_range in sorted(port_ranges, key=lambda port_range: (port_range["minimumPort"], port_range["maximumPort"])):
+        if merged and port_range["minimumPort"] <= merged[-1]["maximumPort"] + 1:
+            merged[-1]["maximumPort"] = max(merged[-1]["maximumPort"], port_range["maximumPort"])
+        else:
+            merged.append(dict(port_range))
+    return merged
+
+def canonical_service_names(service_outputs):
+    """
+    Find structurally identical services (same type and merged port ranges) and
+    service lists (same set of canonical member services). Returns two dicts that
+    map the name of every duplicate to the first object of its kind in the sheet.
+    """
+    service_canonical = {}
+    seen = {}
+    for service in service_outputs['service_input.json']:
+        if not service["portRanges"]:
+            # Services whose ports could not be parsed are never treated as identical
+            continue
+        key = (service["type"], tuple((port_range["minimumPort"], port_range["maximumPort"]) for port_range in service["portRanges"]))
+        canonical = seen.setdefault(key, str(service["name"]).strip())
+        if canonical != str(service["name"]).strip():
+            service_canonical[str(service["name"]).strip()] = canonical
 
+    list_canonical = {}
+    seen = {}
+    for service_list in service_outputs['service_list_input.json']:
+        key = tuple(sorted(set(service_canonical.get(service, service) for service in service_list["services"])))
+        canonical = seen.setdefault(key, str(service_list["name"]).strip())
+        if canonical != str(service_list["name"]).strip():
+            list_canonical[str(service_list["name"]).strip()] = canonical
+    return service_canonical, list_canonical
 
+def rewrite_rule_services(rules, list_canonical, logger):
+    """Point every rule's service list references at the canonical lists, dropping repeats."""
+    rewritten = 0
+    for rule in rules:
+        services = rule["condition"]["service"]
+        if any(service in list_canonical for service in services):
+            rule["condition"]["service"] = list(dict.fromkeys(list_canonical.get(service, service) for service in services))
+            rewritten += 1
+        yield rule
+    logger.info(f"Service optimisation: rewrote the service references of {rewritten} security rules")
 
+def optimise_services(outputs, sheets, logger, mode, symbols=None):
+    """
+    Optimisation pass over the converted services, applied to `outputs` in place.
 
-    # Write data to services.json
-    write_json_to_file(json_list_service, 'service_input.json', logger)
-    # Write data to servicelist.json
-    write_json_to_file(json_list_servicelist, 'service_list_input.json', logger)
-    # Write data to application.json
-    write_json_to_file(json_list_application, 'application_input.json', logger)
-    # Write data to applicationlist.json
-    write_json_to_file(json_list_applicationlist, 'application_list_input.json', logger)
+    'merge' sorts and merges each service's port ranges and reports services and
+    service lists that are structurally identical. 'rewrite' also drops those
+    duplicates, pointing SERVICE_GROUP members and security rule references at one
+    canonical object each. When only the security rules are being converted (one
+    converter per process), the service sheet is converted here, registering its
+    objects in `symbols`, to find the same canonical names.
+    """
+    owns_services = 'service_input.json' in outputs
+    if owns_services:
+        service_outputs = outputs
+    elif mode == 'rewrite' and 'securityrules.json' in outputs and 'service' in sheets:
+        service_outputs = excel_to_json_service_list(sheets, logger, symbols)
+    else:
+        return
 
+    merged = 0
+    for service in service_outputs['service_input.json']:
+        port_ranges = merge_port_ranges(service["portRanges"])
+        merged += len(service["portRanges"]) - len(port_ranges)
+        service["portRanges"] = port_ranges
+    service_canonical, list_canonical = canonical_service_names(service_outputs)
 
+    if owns_services:
+        for duplicate, canonical in list(service_canonical.items()) + list(list_canonical.items()):
+            logger.debug(f"Service optimisation: {duplicate} is identical to {canonical}")
+        logger.info(f"Service optimisation: merged {merged} port ranges, found {len(service_canonical)} duplicate services and {len(list_canonical)} duplicate service lists")
+    if mode != 'rewrite':
+        return
 
-def replace_with_names(df_security_rules, df_iplist, logger):
-    """Replace IP addresses with corresponding names, preserving existing names."""
-    df_security_rules.columns = df_security_rules.columns.str.strip()
-    address_to_name = dict(zip(df_iplist['addresses'], df_iplist['name']))
-    
-    def replace_with_names_single(value):
-        if isinstance(value, str):
-            elements = value.split(',')
-            replaced_elements = []
-            for element in elements:
-                element = element.strip()
-                if element in address_to_name:
-                    replaced_elements.append(address_to_name[element])
-                elif element:
-                    replaced_elements.append(element)
-            return ', '.join(replaced_elements)
-        else:
-            return value
+    if owns_services:
+        services = outputs['service_input.json']
+        service_lists = outputs['service_list_input.json']
+        outputs['service_input.json'] = [service for service in services if str(service["name"]).strip() not in service_canonical]
+        outputs['service_list_input.json'] = [
+            dict(service_list, services=list(dict.fromkeys(service_canonical.get(service, service) for service in service_list["services"])))
+            for service_list in service_lists if str(service_list["name"]).strip() not in list_canonical
+        ]
+        logger.info(f"Service optimisation: {len(services)} -> {len(outputs['service_input.json'])} services, {len(service_lists)} -> {len(outputs['service_list_input.json'])} service lists")
+    if 'securityrules.json' in outputs:
+        outputs['securityrules.json'] = rewrite_rule_services(outputs['securityrules.json'], list_canonical, logger)
 
-    df_security_rules['Source Address Lists'] = df_security_rules['Source Address Lists'].apply(replace_with_names_single)
-    df_security_rules['Destination Address Lists'] = df_security_rules['Destination Address Lists'].apply(replace_with_names_single)
-    
-    return df_security_rules
 
-def convert_to_json(df_security_rule, logger):
+def split_list_column(series, address_to_name=None):
+    """
+    Split a column of comma-separated cells into one list of stripped, non-empty
+    elements per row; NaN and empty cells give []. The split, explode and strip run
+    once over the whole column. With `address_to_name`, elements matching an
+    'iplist' addresses cell are replaced by that list's name.
     """
-    Convert security rules DataFrame to a list of JSON objects.
+    series = series.reset_index(drop=True)
+    present = series.notna() & series.astype(bool)
+    elements = series[present].astype(str).str.split(',').explode().str.strip()
+    elements = elements[elements != '']
 
-    Parameters:
-    df_security_rules (pandas.DataFrame): DataFrame containing security rules data.
+    if address_to_name:
+        renamed = elements.map(address_to_name)
+        elements = renamed.where(renamed.notna(), elements)
+        # The row-wise code joined and re-split cells, so names holding commas or padding are split the same way
+        if any(',' in str(name) or str(name) != str(name).strip() or str(name) == '' for name in address_to_name.values()):
+            elements = elements.astype(str).str.split(',').explode().str.strip()
+            elements = elements[elements != '']
 
-    Returns:
-    list: List of JSON objects representing security rules.
+    lists = [[] for _ in range(len(series))]
+    for row, element in zip(elements.index.tolist(), elements.tolist()):
+        lists[row].append(element)
+    return lists
+
+def address_names(df_iplist):
+    """Map each 'iplist' addresses cell to its list name."""
+    return dict(zip(df_iplist['addresses'], df_iplist['name']))
+
+def iter_security_rules(df_security_rule, logger, address_to_name=None, chunk_size=RULE_CHUNK_SIZE):
+    """
+    Yield security rule JSON objects in sheet order.
+
+    The sheet is processed `chunk_size` rows at a time. Within a chunk each column is
+    split and stripped once as a whole (see split_list_column) and the rule dicts are
+    assembled from the resulting lists. With `address_to_name`, IP addresses in the
+    source and destination columns are replaced by list names in the same pass.
     """
-    json_list = []
     prev_rule_name = None
-    
-    for index, row in df_security_rule.iterrows():
-        source_addresses = [address.strip() for address in str(row['Source Address Lists']).split(',') if address.strip()] if not pd.isna(row['Source Address Lists']) and row['Source Address Lists'] else []
-        destination_addresses = [address.strip() for address in str(row['Destination Address Lists']).split(',') if address.strip()] if not pd.isna(row['Destination Address Lists']) and row['Destination Address Lists'] else []
-        
+    for start in range(0, len(df_security_rule), chunk_size):
+        chunk = df_security_rule.iloc[start:start + chunk_size]
+        source_addresses = split_list_column(chunk['Source Address Lists'], address_to_name)
+        destination_addresses = split_list_column(chunk['Destination Address Lists'], address_to_name)
+        service_ports = split_list_column(chunk['Service Lists'])
+        url_lists = split_list_column(chunk['Url Lists'])
+        icmp_code = split_list_column(chunk['Application Lists'])
+
         # Handling empty or NaN values for action
-        action = row['Action'] if not pd.isna(row['Action']) and row['Action'] else "ALLOW"
-        
-        # Handling empty or NaN values for ports
-        service_ports = [port.strip() for port in str(row['Service Lists']).split(',') if port.strip()] if not pd.isna(row['Service Lists']) and row['Service Lists'] else []
-        
-        url_lists = [url.strip() for url in str(row['Url Lists']).split(',') if url.strip()] if not pd.isna(row['Url Lists']) and row['Url Lists'] else []
-
-        # Handling empty or NaN values for application
-        icmp_code = [code.strip() for code in str(row['Application Lists']).split(',') if code.strip()] if not pd.isna(row['Application Lists']) and row['Application Lists'] else []
-        
-        # Create the JSON object excluding empty source and destination fields
-        json_obj = {
-            "name": row['name'],
-            "condition": {
-                "sourceAddress": source_addresses,
-                "destinationAddress": destination_addresses,
-                "service": service_ports,
-                "url": url_lists,
-                "application": icmp_code
-            },
-            "position": {"afterRule": prev_rule_name} if prev_rule_name else {},
-            "action": action
-        }
-        json_list.append(json_obj)
-        prev_rule_name = row['name']
-    
-    return json_list
+        actions = chunk['Action']
+        actions = actions.where(actions.notna() & actions.astype(bool), "ALLOW").tolist()
+        names = chunk['name'].tolist()
+
+        for index, name in enumerate(names):
+            yield {
+                "name": name,
+                "condition": {
+                    "sourceAddress": source_addresses[index],
+                    "destinationAddress": destination_addresses[index],
+                    "service": service_ports[index],
+                    "url": url_lists[index],
+                    "application": icmp_code[index]
+                },
+                "position": {"afterRule": prev_rule_name} if prev_rule_name else {},
+                "action": actions[index]
+            }
+            prev_rule_name = name
+
+def check_rule_references(rules, symbols, logger):
+    """
+    Yield the rules unchanged, logging the first time a condition names an address
+    list, service list, application list or URL list that `symbols` does not
+    define, or a list whose members all failed validation, and a warning with the
+    count once every rule has been seen. Only the kinds whose sheet was loaded into
+    `symbols` are checked.
+    """
+    checks = []
+    if 'iplist' in symbols.sheets:
+        checks += [('sourceAddress', 'address list', symbols.address_lists, None),
+                   ('destinationAddress', 'address list', symbols.address_lists, None)]
+    if 'service' in symbols.sheets:
+        checks += [('service', 'service list', symbols.service_lists, symbols.expand_service_list),
+                   ('application', 'application list', symbols.application_lists, symbols.expand_application_list)]
+    if 'url_lists' in symbols.sheets:
+        checks.append(('url', 'URL list', symbols.url_lists, None))
+    reported = set()
+    for rule in rules:
+        for field, kind, names, expand in checks:
+            for name in rule["condition"][field]:
+                if (kind, name) in reported:
+                    continue
+                if name not in names:
+                    reported.add((kind, name))
+                    logger.debug(f"Error: {rule['name']} : {name} - {kind} not defined in the workbook.")
+                elif expand is not None and not expand(name):
+                    reported.add((kind, name))
+                    logger.debug(f"Error: {rule['name']} : {name} - {kind} has no valid members.")
+        yield rule
+    if reported:
+        logger.warning(f"Security rules refer to {len(reported)} undefined or empty lists; see the log file for each name.")
+
+def excel_to_json(sheets, logger, symbols=None):
+    """
+    Convert Excel sheet 'security-rules' to JSON, checking the names each rule
+    refers to against `symbols`. The rules are checked as they are written, so
+    convert_sheets can complete the table after every converter has run; without
+    one, a table of the other loaded sheets is built here.
+    """
+    df_security_rules = get_sheet(sheets, 'security-rules').copy()
+    df_iplist = get_sheet(sheets, 'iplist')
+
+    df_security_rules.columns = df_security_rules.columns.str.strip()
+    json_output = iter_security_rules(df_security_rules, logger, address_names(df_iplist))
+    if symbols is None:
+        symbols = build_symbol_table(sheets, logger)
+    return {'securityrules.json': check_rule_references(json_output, symbols, logger)}
+
+def timed_items(items, timings):
+    """
+    Yield from `items`, adding the time spent producing each item to timings['convert'].
+    Streamed outputs are converted while they are written, so this keeps the convert
+    and write stages separate in the timing breakdown.
+    """
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings['convert'] += time.perf_counter() - start
+            return
+        timings['convert'] += time.perf_counter() - start
+        yield item
+
+# Each converter with the sheets it reads, in the order they run. Every converter
+# takes the parsed sheets, the logger and the run's SymbolTable
+CONVERTERS = [
+    (excel_to_json, ['security-rules', 'iplist']),
+    (excel_to_json_iplist, ['iplist']),
+    (excel_to_json_service_list, ['service']),
+    (excel_to_json_url_lists, ['url_lists']),
+]
+
+def convert_objects(sheets, logger):
+    """
+    Run every converter on parsed sheets and return their outputs by filename,
+    without writing them. The rule references are checked against one symbol
+    table, as in convert_sheets.
+    """
+    symbols = SymbolTable()
+    outputs = {}
+    for converter, _ in CONVERTERS:
+        outputs.update(converter(sheets, logger, symbols))
+    build_symbol_table(sheets, logger, symbols)
+    return outputs
+
+def convert_sheets(converters, sheets, logger, output_format, timings, output_dir='.', aggregate_cidrs=False, optimise=None):
+    """
+    Run converters on parsed sheets and write their outputs to output_dir, adding to timings['convert'] and timings['write'].
+    With aggregate_cidrs, the address lists are collapsed to minimal CIDR sets on the way out.
+    With optimise ('merge' or 'rewrite'), the services go through optimise_services.
+    """
+    start = time.perf_counter()
+    # One symbol table per run: the converters register the objects of the sheets they
+    # convert, and only the loaded sheets no converter read here are indexed separately
+    symbols = SymbolTable()
+    outputs = {}
+    for converter in converters:
+        outputs.update(converter(sheets, logger, symbols))
+    if aggregate_cidrs and 'iplist.json' in outputs:
+        outputs['iplist.json'] = aggregate_iplists(outputs['iplist.json'], logger)
+    if optimise:
+        optimise_services(outputs, sheets, logger, optimise, symbols)
+    build_symbol_table(sheets, logger, symbols)
+    timings['convert'] = timings.get('convert', 0.0) + time.perf_counter() - start
+
+    start = time.perf_counter()
+    convert_before_write = timings['convert']
+    for filename, data in outputs.items():
+        write_json_to_file(timed_items(data, timings), os.path.join(output_dir, filename), logger, output_format)
+    timings['write'] = timings.get('write', 0.0) + time.perf_counter() - start - (timings['convert'] - convert_before_write)
+
+def worker_log_settings(logger):
+    """
+    Return the picklable settings worker_logger needs to rebuild `logger` in a
+    pool process: its name, log file and the levels set by setup_logging.
+    A logger pickles by name only, so a process that was spawned rather than
+    forked would otherwise log to a logger without handlers.
+    """
+    file_handler = next((handler for handler in logger.handlers if isinstance(handler, logging.FileHandler)), None)
+    console_handler = next((handler for handler in logger.handlers if type(handler) is logging.StreamHandler), None)
+    return (logger.name,
+            file_handler.baseFilename if file_handler else None,
+            console_handler.level if console_handler else logging.INFO,
+            file_handler.level if file_handler else logging.DEBUG)
+
+def worker_logger(log_settings):
+    """
+    Return the logger described by worker_log_settings. It is set up on the first task
+    a pool process runs; a forked process inherits the parent's handlers and
+    uses them as they are.
+    """
+    logger_name, log_filename, console_level, file_level = log_settings
+    logger = logging.getLogger(logger_name)
+    if not logger.handlers:
+        if log_filename is None:
+            logger.addHandler(logging.NullHandler())
+        else:
+            setup_logging(log_filename, logger_name, console_level, file_level)
+    return logger
+
+def run_converter(converter, sheet_names, excel_file, log_settings, reader, output_format, sheets=None, output_dir='.', aggregate_cidrs=False, optimise=None):
+    """
+    Process pool task: parse only the sheets one converter reads (unless they are
+    given), run the converter and write its outputs. Returns its stage timings.
+    """
+    logger = worker_logger(log_settings)
+    timings = {}
+    start = time.perf_counter()
+    if sheets is None:
+        sheets = load_workbook_sheets(excel_file, logger, reader, sheet_names)
+    timings['load'] = time.perf_counter() - start
+    convert_sheets([converter], sheets, logger, output_format, timings, output_dir, aggregate_cidrs, optimise)
+    return timings
+
+def convert_workbook_parallel(excel_file, logger, reader='openpyxl', output_format='indent', export_dir=None, jobs=None, output_dir='.', aggregate_cidrs=False, optimise=None):
+    """
+    Run each converter in its own process of a pool of `jobs` processes. Every
+    process parses just the sheets its converter reads, so the wall time is bounded
+    by the largest sheet rather than the sum. Each output file is only ever written
+    by one converter and is renamed into place when complete, so the result is the
+    same as a serial run.
+    """
+    start = time.perf_counter()
+    # Checked here so a missing workbook is reported once rather than by every process
+    if export_dir is None and not os.path.exists(excel_file):
+        print(f"File '{excel_file}' not found.")
+        sys.exit(1)
+    sheets = load_export_sheets(export_dir, logger) if export_dir is not None else None
+    # Rewriting rule references needs the canonical service names, so that process also reads the service sheet
+    converter_sheets = [(converter, sheet_names + ['service'] if optimise == 'rewrite' and converter is excel_to_json else sheet_names) for converter, sheet_names in CONVERTERS]
+    # Each process builds its own logger from these, whichever start method the pool uses
+    log_settings = worker_log_settings(logger)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(run_converter, converter, sheet_names, excel_file, log_settings, reader, output_format,
+                            {name: sheets[name] for name in sheet_names if name in sheets} if sheets is not None else None, output_dir, aggregate_cidrs, optimise)
+            for converter, sheet_names in converter_sheets
+        ]
+        # Results are collected in converter order, so the log is deterministic
+        results = [future.result() for future in futures]
+    for (converter, _), timings in zip(CONVERTERS, results):
+        logger.info(f"Timing {converter.__name__}: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    logger.info(f"Timing: total {time.perf_counter() - start:.2f}s with {jobs or os.cpu_count()} processes")
 
-def excel_to_json(excel_file, logger):
-    """Convert Excel sheet 'security-rules' to JSON."""
+def convert_workbook(excel_file, logger, reader='openpyxl', output_format='indent', export_dir=None, output_dir='.', aggregate_cidrs=False, optimise=None):
+    """
+    Load the workbook once, run every converter on the parsed sheets and stream the
+    JSON outputs to disk. Logs how long loading, converting and writing each took.
+    With export_dir, the sheets are built from that directory's export files instead.
+    """
+    timings = {}
+    start = time.perf_counter()
+    if export_dir is not None:
+        sheets = load_export_sheets(export_dir, logger)
+    else:
+        sheets = load_workbook_sheets(excel_file, logger, reader)
+    timings['load'] = time.perf_counter() - start
+
+    convert_sheets([converter for converter, _ in CONVERTERS], sheets, logger, output_format, timings, output_dir, aggregate_cidrs, optimise)
+
+    logger.info("Timing: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    return timings
+
+def batch_workbooks(batch):
+    """
+    Return the workbooks to convert in batch mode: every .xlsx file in `batch` if it
+    is a directory, otherwise the paths listed one per line in the manifest file
+    `batch`. Blank lines and lines starting with '#' are skipped, and relative paths
+    are taken relative to the manifest.
+    """
+    if os.path.isdir(batch):
+        return [os.path.join(batch, name) for name in sorted(os.listdir(batch)) if name.endswith('.xlsx') and not name.startswith('~$')]
     try:
-        df_security_rules = pd.read_excel(excel_file, sheet_name='security-rules')
-        df_iplist = pd.read_excel(excel_file, sheet_name='iplist')
+        with open(batch, 'r') as manifest:
+            lines = [line.strip() for line in manifest]
     except FileNotFoundError:
-        print(f"File '{excel_file}' not found.")
+        print(f"Batch directory or manifest '{batch}' not found.")
         sys.exit(1)
+    base_dir = os.path.dirname(batch)
+    return [os.path.join(base_dir, line) for line in lines if line and not line.startswith('#')]
+
+def policy_output_dirs(workbooks, output_dir):
+    """
+    Name one output directory per workbook after the workbook's file name, adding a
+    numeric suffix when two workbooks share a name.
+    """
+    dirs = []
+    used = set()
+    for workbook in workbooks:
+        name = os.path.splitext(os.path.basename(workbook))[0]
+        candidate, suffix = name, 2
+        while candidate in used:
+            candidate, suffix = f"{name}-{suffix}", suffix + 1
+        used.add(candidate)
+        dirs.append(os.path.join(output_dir, candidate))
+    return dirs
+
+def convert_policy(excel_file, output_dir, log_settings, reader, output_format, aggregate_cidrs=False, optimise=None):
+    """
+    Batch task: convert one workbook into its own output directory. A failing
+    policy is reported in the result instead of stopping the batch.
+    """
+    logger = worker_logger(log_settings)
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        timings = convert_workbook(excel_file, logger, reader, output_format, output_dir=output_dir, aggregate_cidrs=aggregate_cidrs, optimise=optimise)
+        status = "ok"
+    except SystemExit:
+        # The converters print the reason before exiting
+        timings, status = {}, "failed"
     except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        logger.exception(f"Converting {excel_file} failed: {e}")
+        timings, status = {}, "failed"
+    if status != "ok" and os.path.isdir(output_dir) and not os.listdir(output_dir):
+        os.rmdir(output_dir)
+    return {"status": status, "timings": timings, "seconds": time.perf_counter() - start}
+
+def convert_batch(batch, output_dir, logger, reader='openpyxl', output_format='indent', jobs=None, aggregate_cidrs=False, optimise=None):
+    """
+    Convert every workbook named by `batch` into a per-policy directory under
+    output_dir. The policies are spread across a pool of `jobs` processes, so the
+    interpreter and pandas are loaded once per process rather than once per policy.
+    Logs a summary with each policy's timings.
+    """
+    workbooks = batch_workbooks(batch)
+    if not workbooks:
+        print(f"No workbooks found in '{batch}'.")
         sys.exit(1)
-    
-    df_security_rules = replace_with_names(df_security_rules, df_iplist)
-    json_output = convert_to_json(df_security_rules)
-    write_json_to_file(json_output, 'securityrules.json', logger)
+    dirs = policy_output_dirs(workbooks, output_dir)
 
+    start = time.perf_counter()
+    log_settings = worker_log_settings(logger)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(convert_policy, workbook, policy_dir, log_settings, reader, output_format, aggregate_cidrs, optimise) for workbook, policy_dir in zip(workbooks, dirs)]
+        # Results are collected in manifest order, so the summary is deterministic
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"Batch summary ({len(workbooks)} policies, {jobs or os.cpu_count()} processes):")
+    for workbook, policy_dir, result in zip(workbooks, dirs, results):
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["timings"].items())
+        logger.info(f"  {result['status']:<6} {workbook} -> {policy_dir} in {result['seconds']:.2f}s" + (f" ({stages})" if stages else ""))
+    failed = sum(1 for result in results if result["status"] != "ok")
+    busy = sum(result["seconds"] for result in results)
+    logger.info(f"{len(workbooks) - failed} converted, {failed} failed in {elapsed:.2f}s ({busy:.2f}s of conversion work)")
+    if failed:
+        sys.exit(1)
+
+def plan_changes(live, target, firewall_diff, logger):
+    """
+    Return the operations that turn the live policy (an exported snapshot) into
+    the target (the converted workbook), as create/update/delete dicts carrying
+    the import JSON body of each created or updated object.
+
+    Only new rules and the fewest existing rules needed to restore the order get
+    a position, placing them after their predecessor in the target order (or
+    before the current first rule). Rules are placed in target order, so each
+    predecessor is already where it belongs when a rule is placed after it.
+    """
+    changes = firewall_diff.diff_snapshots(live, target)['changes']
+    operations = []
+    for kind in PLAN_ORDER[:-1]:
+        for name in changes[kind]['added']:
+            operations.append({'operation': 'create', 'kind': kind, 'name': name, 'body': target['raw'][kind][name]})
+        for modified in changes[kind]['modified']:
+            operations.append({'operation': 'update', 'kind': kind, 'name': modified['name'], 'changes': sorted(modified['changes']), 'body': target['raw'][kind][modified['name']]})
+
+    added = set(changes['rules']['added'])
+    moved = set(changes['rules']['moved'])
+    modified = {entry['name']: sorted(entry['changes']) for entry in changes['rules']['modified']}
+    first_rule = next(iter(live['rules']), None)
+    previous = None
+    for name in target['rules']:
+        body = {key: value for key, value in target['raw']['rules'][name].items() if key != 'position'}
+        if name in added or name in moved:
+            body['position'] = {'afterRule': previous} if previous else ({'beforeRule': first_rule} if first_rule else {})
+        if name in added:
+            operations.append({'operation': 'create', 'kind': 'rules', 'name': name, 'body': body})
+        elif name in moved or name in modified:
+            operations.append({'operation': 'update', 'kind': 'rules', 'name': name, 'changes': modified.get(name, []) + (['position'] if name in moved else []), 'body': body})
+        previous = name
+
+    for kind in reversed(PLAN_ORDER):
+        for name in changes[kind]['removed']:
+            operations.append({'operation': 'delete', 'kind': kind, 'name': name})
+    return operations
+
+def plan_workbook(excel_file, snapshot_dir, logger, reader='openpyxl', output_format='indent', output_dir='.'):
+    """
+    Compare the converted workbook with the exported snapshot in snapshot_dir and
+    write only the operations needed to apply it to plan.json, instead of the full
+    JSON files. Logs how many operations there are against a full upload.
+    """
+    firewall_diff = load_script(FIREWALL_DIFF_SCRIPT)
+    start = time.perf_counter()
+    live = firewall_diff.load_snapshot(snapshot_dir, logger)
+    # The workbook is converted here, so Firewall-diff.py only normalises the objects
+    outputs = convert_objects(load_workbook_sheets(excel_file, logger, reader), logger)
+    target = firewall_diff.snapshot_model(firewall_diff.import_objects(outputs), 'workbook', excel_file, logger, keep_raw=True)
+    logger.info(f"Loaded snapshot '{snapshot_dir}' and workbook '{excel_file}' in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    operations = plan_changes(live, target, firewall_diff, logger)
+    plan_file = os.path.join(output_dir, 'plan.json')
+    write_json_to_file(operations, plan_file, logger, output_format)
+    logger.info(f"Planned in {time.perf_counter() - start:.2f}s, written to {output_filename(plan_file, output_format)}")
+
+    for kind in PLAN_ORDER:
+        counts = {operation: sum(1 for entry in operations if entry['kind'] == kind and entry['operation'] == operation) for operation in ['create', 'update', 'delete']}
+        if any(counts.values()):
+            logger.info(f"  {kind:<18} " + " ".join(f"{operation} {count:>6}" for operation, count in counts.items()))
+    full_upload = sum(len(target[kind]) for kind in PLAN_ORDER)
+    logger.info(f"{len(operations)} operations, against {full_upload} objects in a full upload")
 
 def setup_logging(log_filename, logger_name, console_level, file_level):
     """
@@ -293,7 +1016,17 @@ def parse_arguments(logger):
     """
     logger.debug("Parsing args")
     parser = argparse.ArgumentParser(description='Convert Excel file to JSON')
-    parser.add_argument('-i', '--input', type=str, help='Input Excel file name')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-i', '--input', type=str, help='Input Excel file name')
+    source.add_argument('-e', '--export-dir', type=str, help='Convert the *_output.json files written by Export-Policies.py in this directory directly, without a workbook')
+    source.add_argument('-b', '--batch', type=str, help='Convert every .xlsx workbook in this directory, or every workbook listed in this manifest file, into its own directory under --output-dir')
+    parser.add_argument('-o', '--output-dir', type=str, help='Directory for the JSON files (default: the current directory, or import_output with --batch)')
+    parser.add_argument('-r', '--reader', choices=READERS, default='openpyxl', help='Workbook reader backend (default: openpyxl)')
+    parser.add_argument('-f', '--output-format', choices=OUTPUT_FORMATS, default='indent', help='indent: pretty-printed JSON, compact: JSON without whitespace, jsonl: one object per line in .jsonl files (default: indent)')
+    parser.add_argument('-j', '--jobs', type=int, nargs='?', const=0, default=None, help='Parse and convert the sheets in parallel across a pool of processes, one converter per process; with --batch, the number of policies converted at once (default without a value: one process per CPU)')
+    parser.add_argument('-a', '--aggregate-cidrs', action='store_true', help='Deduplicate and collapse each address list in iplist.json to the minimal set of CIDRs')
+    parser.add_argument('-s', '--optimise-services', choices=SERVICE_OPTIMISATIONS, help='merge: merge overlapping/adjacent port ranges and report identical services and service lists; rewrite: also drop the duplicates and point SERVICE_GROUP members and rule references at one canonical object')
+    parser.add_argument('-p', '--plan', type=str, metavar='SNAPSHOT_DIR', help='With --input, write plan.json with only the create/update/delete operations that turn the policy exported to SNAPSHOT_DIR by Export-Policies.py into the workbook, instead of the full JSON files')
     args = parser.parse_args()
     logger.debug("Done parsing args")
     logger.debug(f"args = {args}")
@@ -311,14 +1044,30 @@ def main():
         )
         args = parse_arguments(logger)
         logger.info(f"STARTING IMPORT-POLICIES.PY")
+        # Checked before any work starts, so pool workers do not each fail on it
+        check_reader(args.reader)
+
+        output_dir = args.output_dir or ('import_output' if args.batch else '.')
+        if args.input or args.export_dir:
+            os.makedirs(output_dir, exist_ok=True)
 
-        if args.input:
-            excel_to_json(args.input, logger)
-            excel_to_json_iplist(args.input, logger)
-            excel_to_json_service_list(args.input, logger)
-            excel_to_json_url_lists(args.input, logger)
+        if args.plan:
+            if not args.input:
+                print("--plan compares a workbook with the exported policy; give the workbook with -i or --input.")
+                sys.exit(1)
+            if args.aggregate_cidrs or args.optimise_services or args.jobs is not None:
+                logger.warning("--aggregate-cidrs, --optimise-services and --jobs are not applied with --plan")
+            plan_workbook(args.input, args.plan, logger, args.reader, args.output_format, output_dir)
+        elif args.batch:
+            convert_batch(args.batch, output_dir, logger, args.reader, args.output_format, args.jobs or None, args.aggregate_cidrs, args.optimise_services)
+        elif args.jobs is not None and (args.input or args.export_dir):
+            convert_workbook_parallel(args.input, logger, args.reader, args.output_format, args.export_dir, args.jobs or None, output_dir, args.aggregate_cidrs, args.optimise_services)
+        elif args.input:
+            convert_workbook(args.input, logger, args.reader, args.output_format, output_dir=output_dir, aggregate_cidrs=args.aggregate_cidrs, optimise=args.optimise_services)
+        elif args.export_dir:
+            convert_workbook(None, logger, output_format=args.output_format, export_dir=args.export_dir, output_dir=output_dir, aggregate_cidrs=args.aggregate_cidrs, optimise=args.optimise_services)
         else:
-            print("Please provide the input Excel file name using -i or --input option.")
+            print("Please provide the input Excel file name using -i or --input option, an export directory using -e or --export-dir, or a batch using -b or --batch.")
             sys.exit(1)
 
         logger.info(f"FINISHED IMPORT-POLICIES.PY")
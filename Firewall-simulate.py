@@ -0,0 +1,397 @@
+import argparse
+import bisect
+import csv
+import functools
+import ipaddress
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+# Columns a flow log CSV must have; a 'url' column (host name, optionally with a path) is optional
+FLOW_COLUMNS = ['src_ip', 'dst_ip', 'protocol', 'dst_port']
+
+# Protocol names and numbers accepted in flow logs
+PROTOCOLS = {'tcp': 'tcp', '6': 'tcp', 'udp': 'udp', '17': 'udp', 'icmp': 'icmp', '1': 'icmp'}
+
+# Service types that carry port ranges, by protocol
+SERVICE_PROTOCOLS = {'TCP_SERVICE': 'tcp', 'UDP_SERVICE': 'udp'}
+
+# Action of the implicit rule at the end of every policy
+DEFAULT_ACTION = 'DROP'
+
+# Rules shown in the console hit summary
+TOP_HITS = 20
+
+def load_output(input_dir, filename):
+    """
+    Load one of Firewall-import.py's outputs from input_dir, as a JSON array or,
+    for --output-format jsonl, from the .jsonl file of the same name.
+    Returns an empty list if neither exists.
+    """
+    path = os.path.join(input_dir, filename)
+    jsonl_path = path[:-len('.json')] + '.jsonl'
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return []
+
+def bitset(indices):
+    """Return an int with the given bit positions set, built in one pass."""
+    indices = list(indices)
+    if not indices:
+        return 0
+    bits = bytearray(max(indices) // 8 + 1)
+    for index in indices:
+        bits[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(bits, 'little')
+
+class IntervalIndex:
+    """
+    Maps integer keys (addresses or ports) to the objects whose ranges contain them.
+    The boundaries of all ranges split the key space into elementary segments, each
+    covered by a fixed set of objects; a sweep over the sorted boundaries records
+    that set per segment, and a lookup is a binary search for the segment.
+    """
+    def __init__(self, ranges):
+        events = {}
+        for first, last, object_id in ranges:
+            events.setdefault(first, []).append((1, object_id))
+            events.setdefault(last + 1, []).append((-1, object_id))
+        # Objects may have overlapping ranges, so coverage is counted rather than toggled
+        active = {}
+        self.points = []
+        self.members = []
+        for point in sorted(events):
+            for delta, object_id in events[point]:
+                count = active.get(object_id, 0) + delta
+                if count:
+                    active[object_id] = count
+                else:
+                    del active[object_id]
+            self.points.append(point)
+            self.members.append(tuple(sorted(active)))
+
+    def lookup(self, key):
+        """Return (segment number, objects covering key); segment -1 lies before every range."""
+        segment = bisect.bisect_right(self.points, key) - 1
+        return segment, self.members[segment] if segment >= 0 else ()
+
+class RuleDimension:
+    """
+    One match dimension of the rule set (source address, destination address, or
+    port/ICMP type for one protocol). Resolves a key to the bitset of rules that
+    accept it on this dimension: the rules that accept anything, plus the rules
+    that name an object covering the key. Results are cached per segment, so the
+    OR over objects runs once per segment no matter how many flows land in it.
+    """
+    def __init__(self, index, object_rules, any_rules):
+        self.index = index
+        self.object_rules = object_rules
+        self.any_rules = any_rules
+        self.cache = {}
+
+    def rules(self, key):
+        segment, objects = self.index.lookup(key)
+        bits = self.cache.get(segment)
+        if bits is None:
+            bits = self.any_rules
+            for object_id in objects:
+                bits |= self.object_rules.get(object_id, 0)
+            self.cache[segment] = bits
+        return bits
+
+@functools.lru_cache(maxsize=1 << 16)
+def parse_address(value):
+    """Return (IP version, integer address) for a flow log address."""
+    address = ipaddress.ip_address(value.strip())
+    return address.version, int(address)
+
+def url_pattern_regex(pattern):
+    """Compile a SIMPLE URL list pattern, where '*' matches any run of characters, into a regex."""
+    return re.compile('^' + '.*'.join(re.escape(part) for part in pattern.lower().split('*')) + '$')
+
+class PolicySimulator:
+    """
+    Offline first-match evaluation of the rules in securityrules.json against flows.
+
+    Rule i is bit i of every bitset, so rule order is bit order. Each dimension
+    yields the bitset of rules it accepts, the bitsets are ANDed, and the lowest set
+    bit is the first matching rule. No flow ever scans the rule list.
+
+    Matching follows the rule conditions: an empty condition accepts anything. A
+    rule with service lists only matches TCP/UDP flows on their ports, and a rule
+    with application lists only matches ICMP flows on their type; a rule with
+    both matches either. A rule with URL lists only matches flows whose url
+    matches one of the patterns. Names that are not address lists are read as
+    literal addresses; names that resolve to nothing match nothing.
+    """
+    def __init__(self, rules, iplists, services, service_lists, applications, application_lists, url_lists, logger):
+        self.rules = rules
+        self.logger = logger
+        self.unresolved = set()
+        conditions = [rule.get('condition', {}) for rule in rules]
+
+        address_ranges = {4: [], 6: []}
+        for iplist in iplists:
+            for address in iplist.get('addresses', []):
+                self.add_network_range(address_ranges, address, iplist['name'])
+        known_addresses = {iplist['name'] for iplist in iplists}
+        for condition in conditions:
+            for name in condition.get('sourceAddress', []) + condition.get('destinationAddress', []):
+                # Addresses the converter could not map to a list name stay literal
+                if name not in known_addresses and name not in self.unresolved:
+                    if not self.add_network_range(address_ranges, name, name):
+                        self.unresolved.add(name)
+                    known_addresses.add(name)
+        self.address_index = {version: IntervalIndex(ranges) for version, ranges in address_ranges.items()}
+
+        source_rules = self.object_rules(conditions, 'sourceAddress')
+        destination_rules = self.object_rules(conditions, 'destinationAddress')
+        any_source = bitset(i for i, condition in enumerate(conditions) if not condition.get('sourceAddress'))
+        any_destination = bitset(i for i, condition in enumerate(conditions) if not condition.get('destinationAddress'))
+        self.source = {version: RuleDimension(index, source_rules, any_source) for version, index in self.address_index.items()}
+        self.destination = {version: RuleDimension(index, destination_rules, any_destination) for version, index in self.address_index.items()}
+
+        # Rules without service or application conditions accept every protocol
+        any_protocol = bitset(i for i, condition in enumerate(conditions) if not condition.get('service') and not condition.get('application'))
+        service_by_name = {service['name']: service for service in services}
+        port_ranges = {'tcp': [], 'udp': []}
+        for service_list in service_lists:
+            for member in service_list.get('services', []):
+                service = service_by_name.get(member)
+                if service is None or service.get('type') not in SERVICE_PROTOCOLS:
+                    continue
+                for port_range in service.get('portRanges', []):
+                    if port_range.get('minimumPort') is not None and port_range.get('maximumPort') is not None:
+                        port_ranges[SERVICE_PROTOCOLS[service['type']]].append((port_range['minimumPort'], port_range['maximumPort'], service_list['name']))
+        service_rules = self.object_rules(conditions, 'service')
+        self.protocols = {protocol: RuleDimension(IntervalIndex(ranges), service_rules, any_protocol) for protocol, ranges in port_ranges.items()}
+
+        application_by_name = {application['name']: application for application in applications}
+        icmp_ranges = []
+        for application_list in application_lists:
+            for member in application_list.get('apps', []):
+                application = application_by_name.get(member)
+                if application is None:
+                    continue
+                icmp_type = application.get('icmpType')
+                icmp_ranges.append((0, 255, application_list['name']) if icmp_type is None else (icmp_type, icmp_type, application_list['name']))
+        self.protocols['icmp'] = RuleDimension(IntervalIndex(icmp_ranges), self.object_rules(conditions, 'application'), any_protocol)
+        self.other_protocols = any_protocol
+
+        self.url_patterns = {}
+        for url_list in url_lists:
+            url_list = url_list.get('data', url_list)
+            self.url_patterns.setdefault(url_list['name'], []).extend(url_pattern_regex(url['pattern']) for url in url_list.get('urls', []))
+        self.url_rules = self.object_rules(conditions, 'url')
+        self.any_url = bitset(i for i, condition in enumerate(conditions) if not condition.get('url'))
+        self.url_cache = {}
+
+        for name in sorted(self.unresolved, key=str):
+            logger.warning(f"'{name}' is neither an address list nor an address; rules using it will not match on it")
+
+    @staticmethod
+    def add_network_range(address_ranges, address, object_id):
+        """Add the integer range of a CIDR or address; returns False if it is not one."""
+        try:
+            network = ipaddress.ip_network(str(address).strip(), strict=False)
+        except ValueError:
+            return False
+        address_ranges[network.version].append((int(network.network_address), int(network.broadcast_address), object_id))
+        return True
+
+    @staticmethod
+    def object_rules(conditions, field):
+        """Return, for every object named in a condition field, the bitset of rules that name it."""
+        indices = {}
+        for i, condition in enumerate(conditions):
+            for name in condition.get(field, []):
+                indices.setdefault(name, []).append(i)
+        return {name: bitset(rule_indices) for name, rule_indices in indices.items()}
+
+    def url_matches(self, url):
+        """Return the bitset of rules whose URL condition accepts url (rules without one always do)."""
+        bits = self.url_cache.get(url)
+        if bits is None:
+            bits = self.any_url
+            if url:
+                host = url.split('://', 1)[-1].lower()
+                for name, patterns in self.url_patterns.items():
+                    if name in self.url_rules and any(pattern.match(host) or pattern.match(host.split('/', 1)[0]) for pattern in patterns):
+                        bits |= self.url_rules[name]
+            self.url_cache[url] = bits
+        return bits
+
+    def match(self, src_ip, dst_ip, protocol, dst_port, url=None):
+        """
+        Return the index of the first rule matching the flow, or None if only the
+        implicit default rule does. dst_port is the ICMP type for ICMP flows.
+        """
+        source_version, source = parse_address(src_ip)
+        destination_version, destination = parse_address(dst_ip)
+        if source_version != destination_version:
+            return None
+        bits = self.source[source_version].rules(source) & self.destination[destination_version].rules(destination)
+        if not bits:
+            return None
+        protocol = PROTOCOLS.get(str(protocol).strip().lower())
+        if protocol is None:
+            bits &= self.other_protocols
+        else:
+            bits &= self.protocols[protocol].rules(int(dst_port))
+        if bits:
+            bits &= self.url_matches(url or '')
+        if not bits:
+            return None
+        return (bits & -bits).bit_length() - 1
+
+def load_simulator(input_dir, logger):
+    """Build a PolicySimulator from the JSON files Firewall-import.py wrote to input_dir."""
+    rules = load_output(input_dir, 'securityrules.json')
+    if not rules:
+        print(f"No security rules found in '{input_dir}'. Run Firewall-import.py first or pass its output directory with -d.")
+        sys.exit(1)
+    start = time.perf_counter()
+    simulator = PolicySimulator(
+        rules,
+        load_output(input_dir, 'iplist.json'),
+        load_output(input_dir, 'service_input.json'),
+        load_output(input_dir, 'service_list_input.json'),
+        load_output(input_dir, 'application_input.json'),
+        load_output(input_dir, 'application_list_input.json'),
+        load_output(input_dir, 'url_lists.json'),
+        logger
+    )
+    logger.info(f"Indexed {len(rules)} rules in {time.perf_counter() - start:.2f}s")
+    return simulator
+
+def simulate_flow_log(simulator, flow_file, output_file, logger):
+    """
+    Evaluate every flow in the flow log CSV and write it to output_file with the
+    matching rule and action appended. Logs the hits per rule and the flow rate.
+    """
+    hits = {}
+    start = time.perf_counter()
+    flows = 0
+    with open(flow_file, 'r', newline='') as infile, open(output_file, 'w', newline='') as outfile:
+        reader = csv.DictReader(infile)
+        missing = [column for column in FLOW_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            print(f"Flow log '{flow_file}' is missing the column(s): {', '.join(missing)}")
+            sys.exit(1)
+        writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames + ['rule', 'action'])
+        writer.writeheader()
+        rules = simulator.rules
+        for row in reader:
+            try:
+                index = simulator.match(row['src_ip'], row['dst_ip'], row['protocol'], row['dst_port'], row.get('url'))
+            except ValueError as e:
+                logger.warning(f"Skipping flow on line {reader.line_num}: {e}")
+                continue
+            hits[index] = hits.get(index, 0) + 1
+            row['rule'] = rules[index]['name'] if index is not None else ''
+            row['action'] = rules[index].get('action') if index is not None else DEFAULT_ACTION
+            writer.writerow(row)
+            flows += 1
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"Evaluated {flows} flows in {elapsed:.2f}s ({flows / elapsed if elapsed > 0 else 0:.0f} flows/s), results in {output_file}")
+    logger.info(f"Hits per rule (top {TOP_HITS} in the console, all in the log file):")
+    for rank, (index, count) in enumerate(sorted(hits.items(), key=lambda item: -item[1])):
+        name = simulator.rules[index]['name'] if index is not None else '(default)'
+        action = simulator.rules[index].get('action') if index is not None else DEFAULT_ACTION
+        logger.log(logging.INFO if rank < TOP_HITS else logging.DEBUG, f"  {count:>10} {action:<6} {name}")
+
+
+def setup_logging(log_filename, logger_name, console_level, file_level):
+    """
+    setup_logging
+
+    Takes in
+    log_filename
+    logger_name
+    console_level
+    file_level
+
+    Returns logger
+    """
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(logging.DEBUG)
+    fh = logging.FileHandler(log_filename)
+    fh.setLevel(file_level)
+    ch = logging.StreamHandler()
+    ch.setLevel(console_level)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+def parse_arguments(logger):
+    """
+    parse_arguments
+
+    Takes in
+    logger
+
+    Returns args
+    """
+    logger.debug("Parsing args")
+    parser = argparse.ArgumentParser(description='Find the security rule that would match a flow, using the JSON files written by Firewall-import.py')
+    parser.add_argument('-d', '--input-dir', default='.', help='Directory holding securityrules.json and the list files (default: current directory)')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-f', '--flows', help="Flow log CSV with columns src_ip, dst_ip, protocol, dst_port (ICMP type for ICMP) and optionally url")
+    source.add_argument('-q', '--query', nargs='+', metavar='FIELD', help='A single flow: SRC_IP DST_IP PROTOCOL DST_PORT [URL]')
+    parser.add_argument('-o', '--output', default='simulation_output.csv', help='Where --flows results are written (default: simulation_output.csv)')
+    args = parser.parse_args()
+    logger.debug("Done parsing args")
+    logger.debug(f"args = {args}")
+    return args
+
+
+def main():
+    try:
+        # set up logging stuff
+        logger = setup_logging(
+            log_filename="simulate_policies.log",
+            logger_name="simulate_policies",
+            console_level=logging.INFO,
+            file_level=logging.DEBUG
+        )
+        args = parse_arguments(logger)
+        logger.info(f"STARTING FIREWALL-SIMULATE.PY")
+
+        if args.query:
+            if len(args.query) not in (4, 5):
+                print("--query takes SRC_IP DST_IP PROTOCOL DST_PORT [URL].")
+                sys.exit(1)
+            simulator = load_simulator(args.input_dir, logger)
+            index = simulator.match(*args.query)
+            if index is None:
+                print(f"No rule matches; the default action is {DEFAULT_ACTION}.")
+            else:
+                print(f"Rule #{index + 1} '{simulator.rules[index]['name']}' matches: {simulator.rules[index].get('action')}")
+        elif args.flows:
+            simulator = load_simulator(args.input_dir, logger)
+            simulate_flow_log(simulator, args.flows, args.output, logger)
+        else:
+            print("Please provide a flow log using -f or --flows, or a single flow using -q or --query.")
+            sys.exit(1)
+
+        logger.info(f"FINISHED FIREWALL-SIMULATE.PY")
+    except SystemExit:
+        pass # nothing wrong here, just exit if we catch this
+
+    except BaseException as e:
+        logger.exception(f"Something went wrong:  {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Loads the hyphen-named scripts of this repository, such as Firewall-import.py,
+as modules so other scripts, the benchmarks and the tests can call their functions.
+"""
+import importlib.util
+import os
+import sys
+
+# Relative script paths are taken from the repository root
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(path):
+    """
+    Load the script at `path` (absolute, or relative to the repository root) as a
+    module named after it, e.g. Firewall-import.py as firewall_import. Its directory
+    is put on sys.path first, so it imports the modules next to it as it does when
+    run directly.
+    """
+    path = os.path.join(REPO_DIR, path)
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(os.path.basename(path).replace('-', '_').replace('.py', ''), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
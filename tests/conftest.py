@@ -0,0 +1,26 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from script_loader import load_script  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def firewall_import():
+    return load_script("Firewall-import.py")
+
+
+@pytest.fixture(scope="session")
+def export_policies():
+    return load_script("Firewall-export/Export-Policies.py")
+
+
+@pytest.fixture
+def logger():
+    """Logger for the code under test; caplog sees everything down to DEBUG."""
+    logger = logging.getLogger("tests")
+    logger.setLevel(logging.DEBUG)
+    return logger
@@ -0,0 +1,30 @@
+import json
+import os
+
+POLICY_ID = "ocid1.networkfirewallpolicy.oc1..test"
+
+
+def export_rules(export_policies, backend, output_dir, logger):
+    """Export the security rules with --list-only and return the written items."""
+    input_file = os.path.join(output_dir, "security_rule.json")
+    output_file = os.path.join(output_dir, "security_rule_output.json")
+    with open(input_file, 'w') as f:
+        json.dump(backend.list_items("security-rule"), f)
+    export_policies.export_items("security-rule", input_file, output_file, backend, logger, workers=2, list_only=True)
+    with open(output_file, 'r') as f:
+        return json.load(f)
+
+
+def test_full_summaries_are_not_fetched(export_policies, logger, tmp_path):
+    backend = export_policies.FakeBackend(POLICY_ID, 20, 0.0, True, logger)
+    rules = export_rules(export_policies, backend, tmp_path, logger)
+    # Only the list call: every summary carries the required fields
+    assert backend.calls == 1
+    assert rules == [{"data": rule} for rule in backend.policy["security-rule"]]
+
+
+def test_thin_summaries_are_fetched(export_policies, logger, tmp_path):
+    backend = export_policies.FakeBackend(POLICY_ID, 20, 0.0, False, logger)
+    rules = export_rules(export_policies, backend, tmp_path, logger)
+    assert backend.calls == 1 + 20
+    assert rules == [backend.get_item("security-rule", f"rule-{i}", POLICY_ID) for i in range(20)]
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+POLICY_ID = "ocid1.networkfirewallpolicy.oc1..test"
+
+
+class DyingBackend:
+    """Fake backend whose get calls fail once `limit` of them have been made, like an expired token."""
+    def __init__(self, backend, limit=None):
+        self.backend = backend
+        self.limit = limit
+        self.gets = 0
+
+    def list_items(self, resource):
+        return self.backend.list_items(resource)
+
+    def get_item(self, resource, name, parent_resource_id):
+        if self.limit is not None and self.gets >= self.limit:
+            raise RuntimeError("security token expired")
+        self.gets += 1
+        return self.backend.get_item(resource, name, parent_resource_id)
+
+
+def export_rules(export_policies, backend, output_dir, logger, resume):
+    """Export the security rules with a journal and return the written items."""
+    input_file = os.path.join(output_dir, "security_rule.json")
+    output_file = os.path.join(output_dir, "security_rule_output.json")
+    with open(input_file, 'w') as f:
+        json.dump(backend.list_items("security-rule"), f)
+    export_policies.export_items("security-rule", input_file, output_file, backend, logger, journal_file=output_file + ".journal", resume=resume)
+    with open(output_file, 'r') as f:
+        return json.load(f)
+
+
+def test_resume_after_torn_journal_line(export_policies, logger, tmp_path):
+    fake = export_policies.FakeBackend(POLICY_ID, 30, 0.0, False, logger)
+    journal_file = tmp_path / "security_rule_output.json.journal"
+
+    with pytest.raises(RuntimeError):
+        export_rules(export_policies, DyingBackend(fake, limit=10), tmp_path, logger, resume=False)
+    # The run died while writing the next record
+    with open(journal_file, 'a') as f:
+        f.write('{"name": "rule-10", "item": {"da')
+
+    with pytest.raises(RuntimeError):
+        export_rules(export_policies, DyingBackend(fake, limit=5), tmp_path, logger, resume=True)
+    journaled, complete = export_policies.load_journal(str(journal_file))
+    assert len(journaled) == 15 and complete == os.path.getsize(journal_file)
+
+    backend = DyingBackend(fake)
+    resumed = export_rules(export_policies, backend, tmp_path, logger, resume=True)
+    assert backend.gets == 15
+    assert resumed == [fake.get_item("security-rule", f"rule-{i}", POLICY_ID) for i in range(30)]
+
+
+def test_journal_damaged_by_an_earlier_resume(export_policies, tmp_path):
+    # A journal resumed before torn lines were cut off has a glued line in the middle
+    journal_file = tmp_path / "items.journal"
+    lines = [json.dumps({"name": f"item-{i}", "item": {"data": {"name": f"item-{i}"}}}) for i in range(4)]
+    journal_file.write_text(lines[0] + "\n" + '{"name": "item-x", "it' + lines[1] + "\n" + lines[2] + "\n" + lines[3])
+
+    journaled, complete = export_policies.load_journal(str(journal_file))
+    assert sorted(journaled) == ["item-0", "item-2"]
+    assert complete == len(journal_file.read_bytes()) - len(lines[3])
@@ -0,0 +1,74 @@
+import logging
+
+import pandas as pd
+
+NAN = float('nan')
+
+
+def workbook_sheets():
+    """A small workbook whose groups and rules each name one object that does not exist."""
+    service = pd.DataFrame([
+        {"name": "ssh", "type": "TCP_SERVICE", "minimumPort": 22, "maximumPort": 22, "icmpType": NAN, "services": NAN},
+        {"name": "echo", "type": "ICMP_TYPE", "minimumPort": NAN, "maximumPort": NAN, "icmpType": 8, "services": NAN},
+        {"name": "admin", "type": "SERVICE_GROUP", "minimumPort": NAN, "maximumPort": NAN, "icmpType": NAN, "services": "ssh, telnet"},
+        {"name": "ping", "type": "ICMP_GROUP", "minimumPort": NAN, "maximumPort": NAN, "icmpType": NAN, "services": "echo, timestamp"},
+        {"name": "legacy", "type": "SERVICE_GROUP", "minimumPort": NAN, "maximumPort": NAN, "icmpType": NAN, "services": "telnet"},
+    ])
+    iplist = pd.DataFrame([{"name": "office", "addresses": "10.0.0.0/24"}])
+    url_lists = pd.DataFrame([{"name": "docs", "pattern": "docs.example.com"}])
+    security_rules = pd.DataFrame([
+        {"name": "r1", "Source Address Lists": "office", "Destination Address Lists": "datacenter",
+         "Service Lists": "admin", "Url Lists": "docs", "Application Lists": "ping", "Action": "ALLOW"},
+        {"name": "r2", "Source Address Lists": "10.0.0.0/24", "Destination Address Lists": NAN,
+         "Service Lists": "legacy", "Url Lists": "news", "Application Lists": NAN, "Action": "DROP"},
+    ])
+    return {'security-rules': security_rules, 'iplist': iplist, 'service': service, 'url_lists': url_lists}
+
+
+def test_unknown_group_members_are_dropped(firewall_import, logger, caplog):
+    symbols = firewall_import.SymbolTable()
+    with caplog.at_level(logging.DEBUG, logger="tests"):
+        outputs = firewall_import.excel_to_json_service_list(workbook_sheets(), logger, symbols)
+
+    service_lists = {item["name"]: item["services"] for item in outputs['service_list_input.json']}
+    application_lists = {item["name"]: item["apps"] for item in outputs['application_list_input.json']}
+    assert service_lists["admin"] == ["ssh"]
+    assert application_lists["ping"] == ["echo"]
+    assert symbols.expand_application_list("ping") == [symbols.applications["echo"]]
+    assert symbols.expand_service_list("legacy") == []
+    assert "admin : telnet - service not in available services" in caplog.text
+    assert "ping : timestamp - application not in available applications" in caplog.text
+
+
+def test_unknown_rule_references_are_reported(firewall_import, logger, caplog):
+    with caplog.at_level(logging.DEBUG, logger="tests"):
+        rules = list(firewall_import.excel_to_json(workbook_sheets(), logger)['securityrules.json'])
+
+    assert [rule["name"] for rule in rules] == ["r1", "r2"]
+    # The literal address matches an 'iplist' cell, so it is replaced by the list's name
+    assert rules[1]["condition"]["sourceAddress"] == ["office"]
+    assert "r1 : datacenter - address list not defined" in caplog.text
+    assert "r2 : legacy - service list has no valid members" in caplog.text
+    assert "r2 : news - URL list not defined" in caplog.text
+    assert "docs" not in caplog.text and "ping - application list" not in caplog.text
+    assert "refer to 3 undefined or empty lists" in caplog.text
+
+
+def test_unloaded_sheets_are_not_checked(firewall_import, logger, caplog):
+    sheets = workbook_sheets()
+    sheets = {name: sheets[name] for name in ('security-rules', 'iplist')}
+    with caplog.at_level(logging.DEBUG, logger="tests"):
+        list(firewall_import.excel_to_json(sheets, logger)['securityrules.json'])
+
+    assert "datacenter - address list" in caplog.text
+    assert "service list" not in caplog.text and "URL list" not in caplog.text
+
+
+def test_service_sheet_is_converted_once(firewall_import, logger, caplog, tmp_path):
+    with caplog.at_level(logging.DEBUG, logger="tests"):
+        firewall_import.convert_sheets([converter for converter, _ in firewall_import.CONVERTERS], workbook_sheets(), logger, 'indent', {}, str(tmp_path))
+
+    assert caplog.text.count("admin : telnet - service not in available services") == 1
+    assert caplog.text.count("ping : timestamp - application not in available applications") == 1
+    assert "r2 : legacy - service list has no valid members" in caplog.text
+    assert "refer to 3 undefined or empty lists" in caplog.text
@@ -0,0 +1,35 @@
+import logging
+import pickle
+
+def reset_logger(name):
+    """Drop the logger's handlers, as in a freshly spawned pool process."""
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def test_worker_logger_writes_to_parent_log_file(firewall_import, tmp_path):
+    log_filename = str(tmp_path / "import_policies.log")
+    logger = firewall_import.setup_logging(log_filename, "test_import_workers", logging.CRITICAL, logging.DEBUG)
+    settings = pickle.loads(pickle.dumps(firewall_import.worker_log_settings(logger)))
+    reset_logger("test_import_workers")
+    try:
+        worker = firewall_import.worker_logger(settings)
+        worker.debug("logged by a worker")
+        # A second task in the same process reuses the handlers rather than adding more
+        assert firewall_import.worker_logger(settings) is worker and len(worker.handlers) == 2
+    finally:
+        reset_logger("test_import_workers")
+    with open(log_filename) as f:
+        assert "logged by a worker" in f.read()
+
+
+def test_worker_logger_without_log_file(firewall_import):
+    logger = logging.getLogger("test_import_workers_null")
+    logger.addHandler(logging.NullHandler())
+    settings = firewall_import.worker_log_settings(logger)
+    reset_logger("test_import_workers_null")
+    assert settings[1] is None
+    worker = firewall_import.worker_logger(settings)
+    assert [type(handler) for handler in worker.handlers] == [logging.NullHandler]